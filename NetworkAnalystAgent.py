@@ -1,7 +1,10 @@
 # NetworkAnalystAgent.py (Corrected Version)
 
+import logging
+
 from database import DatabaseManager
-import json
+
+logger = logging.getLogger(__name__)
 
 class NetworkAnalystAgent:
     """
@@ -12,27 +15,46 @@ class NetworkAnalystAgent:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
 
-    def process_and_store(self, analysis_data: dict, main_company_name: str):
+    @staticmethod
+    def extract_edges(analysis_data: dict) -> list:
         """
-        Processes the analysis JSON dictionary and stores nodes and relationships.
+        Returns (source, target, relationship_type) tuples for every complete relationship.
         """
-        print(f"Network Analyst: Processing analysis for {main_company_name}")
-        
-        self.db.create_institution_node(main_company_name)
-
-        relationships = analysis_data.get("relationships", [])
-        if not relationships:
-            print("Network Analyst: No new relationships to process.")
-            return
-
-        for rel in relationships:
+        edges = []
+        for rel in analysis_data.get("relationships", []) or []:
             source = rel.get("source_entity")
             target = rel.get("target_entity")
             rel_type = rel.get("relationship_type")
 
             if not all([source, target, rel_type]):
-                continue 
+                continue
+
+            edges.append((source, target, rel_type))
+        return edges
+
+    def process_and_store(self, analysis_data: dict, main_company_name: str):
+        """
+        Processes the analysis JSON dictionary and stores nodes and relationships.
+        """
+        logger.debug("Processing analysis for %s", main_company_name)
 
-            self.db.create_institution_node(source)
-            self.db.create_institution_node(target)
-            self.db.create_relationship_edge(source, target, rel_type)
\ No newline at end of file
+        edges = self.extract_edges(analysis_data)
+        if not edges:
+            logger.debug("No new relationships to process for %s", main_company_name)
+
+        # All nodes and edges for this analysis go to Neo4j in one batched write
+        counts = self.db.upsert_graph([main_company_name], edges)
+        logger.info("Stored graph for %s: %s", main_company_name, counts)
+        return counts
+
+    def process_and_store_many(self, analyses):
+        """
+        Stores several analyses at once. `analyses` is a list of
+        (analysis_data, main_company_name) pairs; everything goes out in one upsert.
+        """
+        companies = [company_name for _, company_name in analyses]
+        edges = [edge for analysis_data, _ in analyses for edge in self.extract_edges(analysis_data)]
+        logger.debug("Processing %d analyses (%d relationships)", len(analyses), len(edges))
+        counts = self.db.upsert_graph(companies, edges)
+        logger.info("Stored graph for %d companies: %s", len(companies), counts)
+        return counts
@@ -1,62 +1,187 @@
 # In agents.py
 
-import os
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import yfinance as yf  # <-- NEW IMPORT
-from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from cache import TTLCache
+from config import get_settings
+import metrics
+from quotes import IntradayHistory, bars_by_ticker, quote_record
+
+logger = logging.getLogger(__name__)
+
+NEWS_API_URL = "https://newsapi.org/v2/everything"
 
-load_dotenv()
 
 class ScoutAgent:
-    def __init__(self):
-        self.news_api_key = os.getenv("NEWS_API_KEY")
+    """
+    Fetches news and market data. All NewsAPI calls share one pooled, keep-alive
+    HTTP session with timeouts and retry/backoff, and the two sources for a company
+    are fetched concurrently on a small thread pool.
+    """
+    def __init__(self, timeout=(3.05, 10), retries: int = 2, backoff_factor: float = 0.5,
+                 pool_size: int = 20, max_workers: int = 8, intraday_interval: str = "5m",
+                 quote_max_age: float = 60.0, news_api_url: str = NEWS_API_URL, news_api_key: str = None):
+        self.news_api_key = news_api_key or get_settings().news_api_key
+        self.news_api_url = news_api_url
         # NOTE: We no longer need any other API keys
+        # (connect, read) timeout in seconds, so a hung upstream can't pin a worker.
+        # A single number is used for both, as requests does.
+        self.timeout = tuple(timeout) if isinstance(timeout, (tuple, list)) else (timeout, timeout)
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_workers = max_workers
+        # Bar size for quote downloads; the last 24h of bars is kept per ticker
+        self.intraday_interval = intraday_interval
+        self.quote_history = IntradayHistory(max_age=quote_max_age)
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(["GET"]),
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scout")
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def warm_up(self):
+        """
+        Imports yfinance (and pandas with it) ahead of the first quote request.
+        """
+        import yfinance  # noqa: F401
 
     def fetch_news(self, company_name: str):
-        # This function for news remains the same
-        print(f"Scout Agent: Fetching news for {company_name}...")
-        url = (f"https://newsapi.org/v2/everything?qInTitle={company_name}&language=en&sortBy=publishedAt&pageSize=5&apiKey={self.news_api_key}")
+        logger.debug("Fetching news for %s", company_name)
+        params = {
+            "qInTitle": company_name,
+            "language": "en",
+            "sortBy": "publishedAt",
+            "pageSize": 5,
+            "apiKey": self.news_api_key,
+        }
         try:
-            response = requests.get(url)
-            response.raise_for_status()
+            with metrics.timed("newsapi", "everything"):
+                response = self.session.get(self.news_api_url, params=params, timeout=self.timeout)
+                response.raise_for_status()
+            metrics.UPSTREAM_BYTES.observe(len(response.content), "newsapi", "response")
             articles = response.json().get("articles", [])
             cleaned_articles = [{"source": a.get("source", {}).get("name"), "title": a.get("title"), "content": a.get("description") or a.get("content", "")} for a in articles]
             return cleaned_articles
         except requests.exceptions.RequestException as e:
-            print(f"Scout Agent: Error fetching news: {e}")
+            logger.warning("Error fetching news for %s: %s", company_name, e)
             return []
 
     def fetch_market_data(self, ticker: str):
-        # --- THIS IS THE NEW, MORE RELIABLE VERSION using yfinance ---
-        print(f"Scout Agent: Fetching market data for {ticker} from yfinance...")
-        try:
-            stock = yf.Ticker(ticker)
-            # Get the most recent trading day's data
-            hist = stock.history(period="1d")
-
-            if hist.empty:
-                print(f"Scout Agent: No data found for ticker {ticker} using yfinance.")
-                return None
-
-            # Extract the latest price and calculate the change from the day's open
-            last_price = hist['Close'].iloc[-1]
-            day_open = hist['Open'].iloc[-1]
-            change = last_price - day_open
-            percent_change = (change / day_open) * 100
-
-            market_data = {
-                "current_price": round(last_price, 2),
-                "price_change_24h": round(change, 2),
-                "change_percent_24h": f"{round(percent_change, 2)}%"
-            }
-            return market_data
-
-        except Exception as e:
-            print(f"Scout Agent: Error fetching data from yfinance: {e}")
-            return None
-        # ----------------------------------------------------------------
+        quote = quote_record(self.fetch_market_data_many([ticker]), ticker)
+        if quote is None:
+            logger.info("No data found for ticker %s using yfinance", ticker)
+        return quote
+
+    def fetch_market_data_many(self, tickers):
+        """
+        Quotes for many tickers from a single batched yfinance download.
+
+        Returns a DataFrame indexed by ticker with float columns current_price,
+        price_change_24h, change_percent_24h and as_of (epoch seconds of the last
+        bar); rows are NaN for tickers without data. Tickers refreshed within the
+        last `quote_max_age` seconds are answered from the intraday buffer.
+        """
+        tickers = list(dict.fromkeys(tickers))
+        stale = self.quote_history.stale(tickers)
+        if stale:
+            # Deferred: yfinance pulls in pandas and is slow to import
+            import yfinance as yf
+
+            logger.debug("Fetching market data for %d ticker(s) from yfinance", len(stale))
+            # yfinance manages its own HTTP session, so retries with backoff are done here
+            for attempt in range(self.retries + 1):
+                try:
+                    with metrics.timed("yfinance", "download"):
+                        frame = yf.download(
+                            stale, period="1d", interval=self.intraday_interval, group_by="column",
+                            threads=True, progress=False, timeout=self.timeout[1],
+                        )
+                    for ticker, bars in bars_by_ticker(frame, stale).items():
+                        self.quote_history.extend(ticker, *bars)
+                    self.quote_history.touch(stale)
+                    break
+                except Exception as e:
+                    logger.warning("Error fetching data from yfinance (attempt %d): %s", attempt + 1, e)
+                    if attempt < self.retries:
+                        time.sleep(self.backoff_factor * (2 ** attempt))
+        return self.quote_history.frame(tickers)
 
     def run(self, company_name: str, ticker: str):
-        news_articles = self.fetch_news(company_name)
-        market_data = self.fetch_market_data(ticker)
-        return {"company_name": company_name, "ticker": ticker, "news_articles": news_articles, "market_data": market_data}
\ No newline at end of file
+        # News and market data come from different upstreams, so fetch them side by side
+        news_future = self._executor.submit(self.fetch_news, company_name)
+        market_future = self._executor.submit(self.fetch_market_data, ticker)
+        return {"company_name": company_name, "ticker": ticker, "news_articles": news_future.result(), "market_data": market_future.result()}
+
+    def run_many(self, companies, max_concurrency: int = None):
+        """
+        Runs the scout for many companies at once.
+        companies: iterable of (company_name, ticker) tuples.
+        max_concurrency: upper bound on upstream fetches in flight (defaults to max_workers).
+        Returns the data contracts in the same order as `companies`.
+        """
+        companies = list(companies)
+        with ThreadPoolExecutor(max_workers=max_concurrency or self.max_workers, thread_name_prefix="scout-many") as pool:
+            # One batched download covers every ticker while the news requests run
+            quotes = pool.submit(self.fetch_market_data_many, [ticker for _, ticker in companies])
+            news = [pool.submit(self.fetch_news, company_name) for company_name, _ in companies]
+            quotes = quotes.result()
+            return [
+                {"company_name": company_name, "ticker": ticker, "news_articles": articles.result(),
+                 "market_data": quote_record(quotes, ticker)}
+                for (company_name, ticker), articles in zip(companies, news)
+            ]
+
+
+class CachedScoutAgent(ScoutAgent):
+    """
+    ScoutAgent with a shared TTL cache in front of both upstreams. News is keyed by
+    company and market data by ticker, each with its own TTL, so the risk and
+    condition endpoints (and repeated dashboard polls) reuse one fetch. Concurrent
+    misses for the same key share a single in-flight request.
+
+    The intraday buffer underneath answers for quote_ttl seconds too (unless
+    quote_max_age is given), so a quote cache miss never returns an older price.
+    """
+    def __init__(self, news_ttl: float = 300.0, quote_ttl: float = 15.0, maxsize: int = 1024, **kwargs):
+        kwargs.setdefault("quote_max_age", quote_ttl)
+        super().__init__(**kwargs)
+        self.news_cache = TTLCache(ttl=news_ttl, maxsize=maxsize)
+        self.quote_cache = TTLCache(ttl=quote_ttl, maxsize=maxsize)
+
+    def fetch_news(self, company_name: str):
+        key = company_name.strip().lower()
+        # A failed request comes back as []; don't serve that as "no news" for the whole TTL
+        return self.news_cache.get_or_load(
+            key,
+            lambda: super(CachedScoutAgent, self).fetch_news(company_name),
+            cache_if=bool,
+        )
+
+    def fetch_market_data(self, ticker: str):
+        key = ticker.strip().upper()
+        # A failed quote comes back as None; don't pin that for the whole TTL
+        return self.quote_cache.get_or_load(
+            key,
+            lambda: super(CachedScoutAgent, self).fetch_market_data(ticker),
+            cache_if=lambda market_data: market_data is not None,
+        )
+
+    def cache_stats(self) -> dict:
+        return {"news": self.news_cache.stats(), "market_data": self.quote_cache.stats()}
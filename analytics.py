@@ -0,0 +1,355 @@
+# analytics.py
+import logging
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Share of a neighbour's risk that carries over each hop, and how many hops it travels
+CONTAGION_DECAY = 0.5
+CONTAGION_HOPS = 3
+PAGERANK_DAMPING = 0.85
+
+
+class CSRGraph:
+    """
+    Undirected adjacency of the institution graph in compressed sparse row form:
+    the neighbours of node i are indices[indptr[i]:indptr[i + 1]]. Every
+    RELATIONSHIP edge appears once in each direction; self-loops are dropped.
+    """
+    def __init__(self, node_count: int, sources: np.ndarray, targets: np.ndarray):
+        keep = sources != targets
+        rows = np.concatenate([sources[keep], targets[keep]])
+        cols = np.concatenate([targets[keep], sources[keep]])
+        order = np.argsort(rows, kind="stable")
+        self.node_count = node_count
+        self.rows = rows[order]
+        self.indices = cols[order]
+        self.degree = np.bincount(self.rows, minlength=node_count)
+        self.indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(self.degree, out=self.indptr[1:])
+
+    def neighbor_sum(self, values: np.ndarray) -> np.ndarray:
+        return np.bincount(self.rows, weights=values[self.indices], minlength=self.node_count)
+
+    def neighbor_max(self, values: np.ndarray) -> np.ndarray:
+        # 0 for isolated nodes
+        result = np.zeros(self.node_count, dtype=np.float64)
+        connected = self.degree > 0
+        if connected.any():
+            result[connected] = np.maximum.reduceat(values[self.indices], self.indptr[:-1][connected])
+        return result
+
+
+def pagerank(graph: CSRGraph, start: np.ndarray = None, damping: float = PAGERANK_DAMPING,
+             tol: float = 1e-9, max_iter: int = 100):
+    """
+    Power-iteration PageRank over the CSR graph. Passing the previous result as
+    `start` lets an incremental update converge in a few iterations.
+    Returns (scores summing to 1, iterations used).
+    """
+    n = graph.node_count
+    if n == 0:
+        return np.zeros(0), 0
+    scores = np.full(n, 1.0 / n) if start is None else start / start.sum()
+    inverse_degree = np.divide(1.0, graph.degree, out=np.zeros(n), where=graph.degree > 0)
+    dangling = graph.degree == 0
+    for iteration in range(1, max_iter + 1):
+        spread = damping * graph.neighbor_sum(scores * inverse_degree)
+        updated = spread + (damping * scores[dangling].sum() + 1.0 - damping) / n
+        converged = np.abs(updated - scores).sum() < tol
+        scores = updated
+        if converged:
+            break
+    return scores, iteration
+
+
+def propagate_risk(graph: CSRGraph, seeds: np.ndarray, decay: float = CONTAGION_DECAY,
+                   hops: int = CONTAGION_HOPS) -> np.ndarray:
+    """
+    Spreads risk scores along relationships: each hop a node takes on `decay`
+    times the risk of its riskiest neighbour if that is higher than its own.
+    A distressed institution therefore raises its counterparties to
+    score * decay, theirs to score * decay**2, and so on for `hops` hops.
+    """
+    risk = seeds.astype(np.float64, copy=True)
+    for _ in range(hops):
+        updated = np.maximum(risk, decay * graph.neighbor_max(risk))
+        if np.array_equal(updated, risk):
+            break
+        risk = updated
+    return risk
+
+
+class _DisjointSets:
+    """
+    Union-find over node indices. Edges are only ever added to the graph, so
+    clusters can be kept up to date by merging the endpoints of new edges.
+    """
+    def __init__(self):
+        self.parent = np.zeros(0, dtype=np.int64)
+
+    def grow(self, size: int):
+        if size > len(self.parent):
+            self.parent = np.concatenate([self.parent, np.arange(len(self.parent), size)])
+
+    def union_many(self, sources: np.ndarray, targets: np.ndarray):
+        # A plain list is much faster than NumPy for element-wise pointer chasing
+        parent = self.parent.tolist()
+
+        def find(node):
+            while parent[node] != node:
+                parent[node] = parent[parent[node]]
+                node = parent[node]
+            return node
+
+        for source, target in zip(sources.tolist(), targets.tolist()):
+            a, b = find(source), find(target)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+        self.parent = np.array(parent, dtype=np.int64)
+
+    def labels(self) -> np.ndarray:
+        # Pointer jumping until every node points straight at its root
+        labels = self.parent.copy()
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                return labels
+            labels = jumped
+
+
+class AnalyticsSnapshot:
+    """
+    Analytics for one graph version and one set of risk scores. Read-only once built.
+    """
+    def __init__(self, version, names, degree, centrality, cluster, cluster_sizes, seed_risk, risk, compute_seconds):
+        self.version = version
+        self.names = names
+        self.degree = degree
+        self.centrality = centrality
+        self.cluster = cluster
+        self.cluster_sizes = cluster_sizes
+        self.seed_risk = seed_risk
+        self.risk = risk
+        self.compute_seconds = compute_seconds
+        self._index = {name: i for i, name in enumerate(names)}
+
+    def _record(self, i: int) -> dict:
+        return {
+            "institution": self.names[i],
+            "degree": int(self.degree[i]),
+            "centrality": round(float(self.centrality[i]), 6),
+            "cluster": int(self.cluster[i]),
+            "risk_score": None if np.isnan(self.seed_risk[i]) else float(self.seed_risk[i]),
+            "propagated_risk": round(float(self.risk[i]), 3),
+        }
+
+    def _top(self, values: np.ndarray, limit: int, mask: np.ndarray = None) -> list:
+        candidates = np.arange(len(values)) if mask is None else np.flatnonzero(mask)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-values[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-values[candidates], kind="stable")]
+        return [self._record(i) for i in candidates.tolist()]
+
+    def summary(self) -> dict:
+        return {
+            "version": self.version,
+            "institutions": len(self.names),
+            "relationships": int(self.degree.sum() // 2),
+            "clusters": len(self.cluster_sizes),
+            "computed_in_ms": round(self.compute_seconds * 1000, 2),
+        }
+
+    def institution(self, name: str):
+        i = self._index.get(name)
+        if i is None:
+            return None
+        record = self._record(i)
+        record["cluster_size"] = int(self.cluster_sizes[self.cluster[i]])
+        return record
+
+    def most_central(self, limit: int) -> list:
+        return self._top(self.centrality, limit)
+
+    def contagion(self, limit: int) -> list:
+        """
+        Institutions with any risk, own or inherited, highest first.
+        """
+        return self._top(self.risk, limit, mask=self.risk > 0)
+
+    def clusters(self, limit: int, members: int) -> list:
+        """
+        The largest connected clusters, each with its most central members and peak risk.
+        """
+        order = np.argsort(self.cluster, kind="stable")
+        bounds = np.zeros(len(self.cluster_sizes) + 1, dtype=np.int64)
+        np.cumsum(self.cluster_sizes, out=bounds[1:])
+        result = []
+        for cluster in range(min(limit, len(self.cluster_sizes))):
+            nodes = order[bounds[cluster]:bounds[cluster + 1]]
+            central = nodes[np.argsort(-self.centrality[nodes], kind="stable")[:members]]
+            result.append({
+                "cluster": cluster,
+                "size": int(self.cluster_sizes[cluster]),
+                "max_propagated_risk": round(float(self.risk[nodes].max()), 3),
+                "members": [self.names[i] for i in central.tolist()],
+            })
+        return result
+
+
+class GraphAnalytics:
+    """
+    Centrality, connected clusters and risk contagion over the Institution graph,
+    kept in memory as NumPy CSR arrays instead of being traversed in Cypher per request.
+
+    The graph is loaded once, then brought up to date from the graph version: only
+    nodes and edges added since the last load are read (get_graph(since=...)),
+    clusters are merged for the new edges, and PageRank restarts from the previous
+    scores. Like GraphSnapshotCache, the version is rechecked after writes through
+    this process and at most every `revalidate_interval` seconds otherwise.
+
+    Contagion is seeded from the latest rule-based risk_score of each institution,
+    as fed in through update_risk_scores(), and recomputed when those change.
+    """
+    def __init__(self, db_manager, revalidate_interval: float = 1.0,
+                 decay: float = CONTAGION_DECAY, hops: int = CONTAGION_HOPS):
+        self.db = db_manager
+        self.revalidate_interval = revalidate_interval
+        self.decay = decay
+        self.hops = hops
+        self._lock = threading.Lock()
+        # Serialises refreshes so concurrent readers share one Neo4j read
+        self._refresh_lock = threading.Lock()
+        self._snapshot = None
+        self._validated_at = 0.0
+        self._risk_scores = {}
+        self._risk_changed = False
+        self._reset()
+        self.full_loads = 0
+        self.incremental_loads = 0
+        db_manager.add_write_listener(self.invalidate)
+
+    def _reset(self):
+        self._version = None
+        self._node_index = {}
+        self._edge_ids = set()
+        self._names = []
+        self._sources = np.zeros(0, dtype=np.int64)
+        self._targets = np.zeros(0, dtype=np.int64)
+        self._clusters = _DisjointSets()
+        self._centrality = None
+        self._graph = None
+
+    def invalidate(self):
+        with self._lock:
+            self._validated_at = 0.0
+
+    def update_risk_scores(self, reports: list):
+        """
+        Records risk reports ({"company", "risk_score"}) as contagion seeds.
+        """
+        with self._lock:
+            for report in reports:
+                if self._risk_scores.get(report["company"]) != report["risk_score"]:
+                    self._risk_scores[report["company"]] = report["risk_score"]
+                    self._risk_changed = True
+
+    def _apply(self, graph: dict) -> bool:
+        # Folds a get_graph() result into the arrays; False if it doesn't line up
+        # with what is loaded and a full reload is needed
+        for node in graph["nodes"]:
+            if node["id"] not in self._node_index:
+                self._node_index[node["id"]] = len(self._names)
+                self._names.append(node["label"])
+        new_edges = [edge for edge in graph["edges"] if edge["id"] not in self._edge_ids]
+        try:
+            sources = np.array([self._node_index[edge["from"]] for edge in new_edges], dtype=np.int64)
+            targets = np.array([self._node_index[edge["to"]] for edge in new_edges], dtype=np.int64)
+        except KeyError:
+            return False
+        self._edge_ids.update(edge["id"] for edge in new_edges)
+        self._sources = np.concatenate([self._sources, sources])
+        self._targets = np.concatenate([self._targets, targets])
+        self._clusters.grow(len(self._names))
+        self._clusters.union_many(sources, targets)
+        self._version = graph["cursor"]
+        return True
+
+    def _load(self) -> bool:
+        # Brings the arrays up to the current graph version; True if anything changed
+        if self._version is not None:
+            if self.db.get_graph_version() == self._version:
+                return False
+            delta = self.db.get_graph(since=self._version)
+            if not delta["full"] and self._apply(delta):
+                self.incremental_loads += 1
+                return True
+        self._reset()
+        self._apply(self.db.get_graph())
+        self.full_loads += 1
+        return True
+
+    def _compute(self, graph_changed: bool) -> AnalyticsSnapshot:
+        started = time.perf_counter()
+        n = len(self._names)
+        if graph_changed or self._graph is None:
+            self._graph = CSRGraph(n, self._sources, self._targets)
+            start = None
+            if self._centrality is not None and 0 < len(self._centrality) <= n:
+                # New nodes start from the uniform share
+                start = np.concatenate([self._centrality, np.full(n - len(self._centrality), 1.0 / n)])
+            self._centrality, iterations = pagerank(self._graph, start)
+            logger.debug("PageRank over %d institutions converged in %d iterations.", n, iterations)
+            # Relabel clusters 0..k-1, largest first
+            roots, cluster, sizes = np.unique(self._clusters.labels(), return_inverse=True, return_counts=True)
+            by_size = np.argsort(-sizes, kind="stable")
+            rank = np.empty_like(by_size)
+            rank[by_size] = np.arange(len(by_size))
+            self._cluster = rank[cluster]
+            self._cluster_sizes = sizes[by_size]
+
+        with self._lock:
+            scores = dict(self._risk_scores)
+            self._risk_changed = False
+        seed_risk = np.array([scores.get(name, np.nan) for name in self._names], dtype=np.float64)
+        risk = propagate_risk(self._graph, np.nan_to_num(seed_risk), decay=self.decay, hops=self.hops)
+        return AnalyticsSnapshot(
+            self._version, list(self._names), self._graph.degree, self._centrality,
+            self._cluster, self._cluster_sizes, seed_risk, risk, time.perf_counter() - started,
+        )
+
+    def get(self) -> AnalyticsSnapshot:
+        """
+        Returns analytics for the current graph and risk scores, updating them if needed.
+        """
+        with self._lock:
+            snapshot = self._snapshot
+            if (snapshot is not None and not self._risk_changed
+                    and time.monotonic() - self._validated_at < self.revalidate_interval):
+                return snapshot
+
+        with self._refresh_lock:
+            graph_changed = self._load()
+            with self._lock:
+                risk_changed = self._risk_changed
+            if graph_changed or risk_changed or self._snapshot is None:
+                snapshot = self._compute(graph_changed)
+            else:
+                snapshot = self._snapshot
+            with self._lock:
+                self._snapshot = snapshot
+                self._validated_at = time.monotonic()
+            return snapshot
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot is not None else None,
+            "full_loads": self.full_loads,
+            "incremental_loads": self.incremental_loads,
+            "risk_seeds": len(self._risk_scores),
+        }
@@ -1,131 +1,607 @@
 #API.PY.       # api.py
-import os
 import json
-from fastapi import FastAPI, HTTPException
+import base64
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+ 
+import orjson
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
  
 # Import your custom modules
-from database import DatabaseManager
-from agents import ScoutAgent
+from config import Settings, get_settings
+from database import DatabaseManager, DatabaseBusyError
+from graphcache import GraphSnapshotCache, etag_matches
+from graphformat import FORMATS, MIN_COMPRESS_SIZE, WRITERS, compress_chunks, negotiate_encoding
+from analytics import GraphAnalytics
+from agents import CachedScoutAgent
 from croagent import CROAgent
+from cache import TTLCache, SqliteStore
+from upstreams import Upstream, UpstreamTimeout
+from metrics import REGISTRY, configure_logging
+from events import EventBroker
+from timeseries import COLUMNS as TIMESERIES_COLUMNS, TimeSeriesStore, snapshot_row
+ 
+logger = logging.getLogger(__name__)
+ 
+# Upper bound on companies in one /api/risk_alerts sweep
+MAX_BULK_COMPANIES = 200
+ 
+# Dashboards subscribe to /api/events instead of polling. While anyone is subscribed,
+# one loop checks the graph version and another refreshes the companies on screen.
+GRAPH_EVENTS_INTERVAL = 2.0
+COMPANY_EVENTS_INTERVAL = 15.0
+ 
+# Market snapshots and risk scores are buffered in memory and written out this often
+TIMESERIES_FLUSH_INTERVAL = 5.0
+# Upper bound on raw samples in one /api/timeseries/{ticker} response
+MAX_TIMESERIES_POINTS = 100000
+ 
  
 # --- Initialization ---
-app = FastAPI()
-db_manager = DatabaseManager("bolt://localhost:7687", "neo4j", "password")
-scout_agent = ScoutAgent()
-cro_agent = CROAgent()
- 
-# --- Middleware ---
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+class Services:
+    """
+    Everything the endpoints talk to, built from Settings. Constructing it is cheap:
+    the Neo4j driver, the Gemini model and yfinance are set up on first use or by
+    warm_up(), so importing this module needs neither credentials nor a database.
+    Tests and benchmarks can pass their own collaborators.
+    """
+    def __init__(self, settings: Settings = None, db_manager: DatabaseManager = None,
+                 scout_agent: CachedScoutAgent = None, cro_agent: CROAgent = None, llm_cache: TTLCache = None,
+                 timeseries: TimeSeriesStore = None):
+        self.settings = settings or get_settings()
+        self.db_manager = db_manager or DatabaseManager.from_settings(
+            self.settings,
+            max_connection_pool_size=32,
+            connection_acquisition_timeout=5.0,
+            max_concurrency=16,
+        )
+        self.graph_cache = GraphSnapshotCache(self.db_manager)
+        self.graph_analytics = GraphAnalytics(self.db_manager)
+        self.scout_agent = scout_agent or CachedScoutAgent(news_api_key=self.settings.news_api_key)
+        if llm_cache is None:
+            path = self.settings.llm_cache_path
+            llm_cache = TTLCache(ttl=600, maxsize=256, store=SqliteStore(path) if path else None)
+        self.llm_cache = llm_cache
+        self.cro_agent = cro_agent or CROAgent(cache=llm_cache, model_name=self.settings.gemini_model)
+        # Flushed by a background task rather than from the request path
+        self.timeseries = timeseries or TimeSeriesStore(
+            self.settings.timeseries_path, batch_size=None, flush_interval=None
+        )
+ 
+        # Every blocking upstream gets its own bounded pool, concurrency limit and timeout,
+        # so slow Gemini calls can't take the threads that serve graph reads.
+        self.graph_upstream = Upstream("neo4j", max_concurrency=16, timeout=10.0)
+        self.news_upstream = Upstream("newsapi", max_concurrency=8, timeout=15.0)
+        self.market_upstream = Upstream("yfinance", max_concurrency=8, timeout=20.0)
+        self.llm_upstream = Upstream("gemini", max_concurrency=4, timeout=60.0)
+        self.timeseries_upstream = Upstream("timeseries", max_concurrency=4, timeout=10.0)
+        self.upstreams = (
+            self.graph_upstream, self.news_upstream, self.market_upstream, self.llm_upstream, self.timeseries_upstream
+        )
+ 
+        self.event_broker = EventBroker()
+        self._tasks = []
+ 
+    async def run_graph_query(self, fn, *args, **kwargs):
+        """Runs a DatabaseManager read on the Neo4j pool and maps failures to HTTP errors."""
+        try:
+            return await self.graph_upstream.call(fn, *args, **kwargs)
+        except DatabaseBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except UpstreamTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Database query failed: {e}")
+ 
+    async def fetch_company_data(self, company: str, ticker: str) -> dict:
+        """Fetches news and market data for a company concurrently on their own pools."""
+        latest_news, market_data = await asyncio.gather(
+            self.news_upstream.call(self.scout_agent.fetch_news, company),
+            self.market_upstream.call(self.scout_agent.fetch_market_data, ticker),
+        )
+        return {"company_name": company, "ticker": ticker, "news_articles": latest_news, "market_data": market_data}
+ 
+    def record_risk(self, companies: list, reports: list):
+        """
+        Feeds fresh risk reports to the graph analytics and queues each company's
+        market snapshot and risk_score for the time-series store.
+        """
+        self.graph_analytics.update_risk_scores(reports)
+        self.timeseries.append([
+            snapshot_row(company_data["ticker"], company_data["market_data"], risk_score=report["risk_score"])
+            for company_data, report in zip(companies, reports)
+        ])
+ 
+    def _prepare_database(self):
+        self.db_manager.connect()
+        self.db_manager.ensure_schema()
+ 
+    async def warm_up(self):
+        """
+        Connects to Neo4j and bootstraps the schema, configures Gemini and imports
+        yfinance, concurrently and each on its own pool. Failures are logged, not
+        raised: the worker still starts and the affected endpoints report the error.
+        """
+        steps = {
+            "neo4j": self.graph_upstream.call(self._prepare_database),
+            "gemini": self.llm_upstream.call(self.cro_agent.warm_up),
+            "yfinance": self.market_upstream.call(self.scout_agent.warm_up),
+        }
+        results = await asyncio.gather(*steps.values(), return_exceptions=True)
+        for name, result in zip(steps, results):
+            if isinstance(result, Exception):
+                logger.warning("Could not warm up %s: %s", name, result)
+ 
+    def start_publishers(self):
+        self._tasks.append(asyncio.create_task(publish_graph_changes(self)))
+        self._tasks.append(asyncio.create_task(publish_company_updates(self)))
+        self._tasks.append(asyncio.create_task(flush_timeseries(self)))
+ 
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self.scout_agent.close()
+        self.db_manager.close()
+        self.timeseries.close()
+        if self.llm_cache.store is not None:
+            self.llm_cache.store.close()
+        for upstream in self.upstreams:
+            upstream.shutdown()
+ 
+    def cache_stats(self) -> dict:
+        return {
+            "graph_snapshot": self.graph_cache.stats(),
+            **self.scout_agent.cache_stats(),
+            "llm": self.llm_cache.stats(),
+            "timeseries": self.timeseries.stats(),
+        }
+ 
+ 
+def get_services(request: Request) -> Services:
+    return request.app.state.services
+ 
  
 # --- Pydantic Model for Scenario Simulation ---
 class ScenarioRequest(BaseModel):
     scenario: str
  
+ 
+async def upstream_timeout_handler(request: Request, exc: UpstreamTimeout):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+ 
+ 
+# --- Event publishers ---
+async def publish_graph_changes(services: Services):
+    """
+    Broadcasts what was added to the graph as a "graph" event carrying the same
+    delta as /api/graph_data?since=<since>. One version check per interval for the
+    whole process, however many dashboards are open.
+    """
+    broker = services.event_broker
+    cursor = None
+    while True:
+        if broker.idle():
+            # Nobody is listening; new subscribers load the graph themselves
+            cursor = None
+            await broker.wait_for_subscribers()
+        try:
+            version = await services.graph_upstream.call(services.db_manager.get_graph_version)
+            if cursor is not None and version != cursor:
+                delta = await services.graph_upstream.call(services.db_manager.get_graph, since=cursor)
+                broker.publish("graph", {**delta, "since": cursor})
+                version = delta["cursor"]
+            cursor = version
+        except Exception as e:
+            logger.warning("Graph change check failed: %s", e)
+        await asyncio.sleep(GRAPH_EVENTS_INTERVAL)
+ 
+ 
+async def publish_company_update(services: Services, company: str, fingerprints: dict):
+    """
+    Broadcasts a "risk" and then a "condition" event for the company, shaped like the
+    /api/risk_alerts/{company} and /api/company_condition/{company} responses,
+    but only if its headlines or price changed since the last broadcast.
+    """
+    company_data = await services.fetch_company_data(company, company)
+    latest_news = company_data["news_articles"]
+    market_data = company_data["market_data"] or {}
+    if not latest_news and not market_data:
+        return
+    fingerprint = (
+        tuple(article.get("title") for article in latest_news),
+        market_data.get("current_price"),
+        market_data.get("change_percent_24h"),
+    )
+    if fingerprints.get(company) == fingerprint:
+        return
+    fingerprints[company] = fingerprint
+    report = services.cro_agent.assess_risk(company_data)
+    services.record_risk([company_data], [report])
+    services.event_broker.publish("risk", {"company": company, "risk_report": report})
+    condition = await services.llm_upstream.call(services.cro_agent.analyze_company_condition, company_data)
+    services.event_broker.publish(
+        "condition", {"company": company, "report": condition, "news": latest_news, "market_data": market_data}
+    )
+ 
+ 
+async def publish_company_updates(services: Services):
+    """
+    Refreshes the companies shown by any subscriber once per interval. Upstream
+    load grows with the number of distinct companies on screen, and Gemini is only
+    called when a company's data actually changed.
+    """
+    fingerprints = {}
+    while True:
+        await services.event_broker.wait_for_subscribers()
+        companies = sorted(services.event_broker.watched_companies())
+        for company in set(fingerprints) - set(companies):
+            del fingerprints[company]
+        results = await asyncio.gather(
+            *(publish_company_update(services, company, fingerprints) for company in companies),
+            return_exceptions=True,
+        )
+        for company, result in zip(companies, results):
+            if isinstance(result, Exception):
+                logger.warning("Could not refresh %s for subscribers: %s", company, result)
+        await asyncio.sleep(COMPANY_EVENTS_INTERVAL)
+ 
+ 
+async def flush_timeseries(services: Services):
+    """
+    Writes the buffered market snapshots and risk scores as one batch per interval.
+    """
+    while True:
+        await asyncio.sleep(TIMESERIES_FLUSH_INTERVAL)
+        if services.timeseries.pending():
+            try:
+                await services.timeseries_upstream.call(services.timeseries.flush)
+            except Exception as e:
+                logger.warning("Could not write time-series batch: %s", e)
+ 
+ 
 # --- API Endpoints ---
-@app.get("/api/graph_data")
-def get_graph_data():
-    """Returns all nodes and relationships from Neo4j."""
-    query = """
-    MATCH (n:Institution)-[r:RELATIONSHIP]->(m:Institution)
-    RETURN n, r, m
-    UNION
-    MATCH (n:Institution)
-    WHERE NOT (n)-[:RELATIONSHIP]->()
-    RETURN n, NULL AS r, NULL AS m
-    """
-    try:
-        results = db_manager.execute_query(query)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database query failed: {e}")
- 
-    nodes = []
-    edges = []
-    node_ids = set()
- 
-    for record in results:
+router = APIRouter()
+ 
+ 
+@router.get("/api/events")
+async def events(company: Optional[str] = None, services: Services = Depends(get_services)):
+    """
+    Server-sent event stream replacing the dashboard's polling timers. Every
+    subscriber receives the same events: "graph" (graph deltas), "risk" and
+    "condition" (for the companies subscribers passed as `company`). After a
+    reconnect clients resync through the REST endpoints.
+    """
+    return StreamingResponse(
+        services.event_broker.stream(company),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+ 
+ 
+@router.get("/api/graph_data")
+async def get_graph_data(
+    request: Request,
+    since: Optional[int] = None,
+    format: str = Query("json", pattern=f"^({'|'.join(FORMATS)})$"),
+    services: Services = Depends(get_services),
+):
+    """
+    Returns nodes and relationships from Neo4j.
+    Without `since` the whole graph is served from the snapshot cache, with an ETag
+    so unchanged polls get a 304. With the `cursor` from a previous response only
+    nodes and edges added since then are returned, as a chunked response.
+    `format=compact` sends columns with integer edge endpoints and interned
+    relationship types instead of vis.js objects (see graphformat.py). Bodies are
+    gzip- or brotli-compressed when the client accepts it.
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if since is None:
+        snapshot = await services.run_graph_query(services.graph_cache.get, format)
+        if len(snapshot.body) < MIN_COMPRESS_SIZE:
+            encoding = "identity"
+        headers["ETag"] = snapshot.etag_for(encoding)
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            services.graph_cache.record_not_modified()
+            return Response(status_code=304, headers=headers)
+        if encoding == "identity":
+            body = snapshot.body
+        else:
+            # Compressed once per graph version and format, then served from memory
+            body = await services.graph_upstream.call(snapshot.encoded, encoding)
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type="application/json", headers=headers)
+    # Deltas never build the full snapshot; a recently validated one only lets us skip Neo4j
+    if since == services.graph_cache.cached_version():
+        # Client is already up to date; no need to touch Neo4j
+        encoded = WRITERS[format]().finish(since, False)
+    else:
+        encoded = await services.run_graph_query(services.db_manager.encode_graph, WRITERS[format], since=since)
+    if encoded.size < MIN_COMPRESS_SIZE:
+        encoding = "identity"
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(compress_chunks(encoded.chunks, encoding), media_type="application/json", headers=headers)
+ 
+ 
+@router.get("/api/graph/neighborhood/{company}")
+async def get_neighborhood(
+    company: str,
+    hops: int = Query(2, ge=1, le=4),
+    max_nodes: int = Query(200, ge=1, le=5000),
+    max_edges: int = Query(500, ge=1, le=20000),
+    services: Services = Depends(get_services),
+):
+    """Returns the k-hop neighbourhood of a company, capped by node and edge budgets."""
+    result = await services.run_graph_query(
+        services.db_manager.get_neighborhood, company, hops=hops, max_nodes=max_nodes, max_edges=max_edges
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"{company} is not in the graph.")
+    return result
+ 
+ 
+@router.get("/api/graph/export")
+async def export_graph(
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
+    services: Services = Depends(get_services),
+):
+    """Pages through the whole graph. Pass `next_cursor` back as `cursor` until it is null."""
+    after = ""
+    if cursor:
         try:
-            n = record["n"]
-            r = record["r"]
-            m = record["m"]
-        except (KeyError, IndexError):
-            continue
- 
-        nid = n.id
-        if nid not in node_ids:
-            nodes.append({"id": nid, "label": n.get("name")})
-            node_ids.add(nid)
- 
-        if r is not None:
-            start_id = r.start_node.id
-            end_id = r.end_node.id
-            rel_label = r.get("type")
- 
-            if end_id not in node_ids:
-                m_label = m.get("name")
-                nodes.append({"id": end_id, "label": m_label})
-                node_ids.add(end_id)
- 
-            edges.append({
-                "from": start_id,
-                "to": end_id,
-                "label": rel_label
-            })
-    return {"nodes": nodes, "edges": edges}
- 
- 
-@app.get("/api/risk_alerts/{company}")
-def risk_alerts(company: str):
+            after = base64.urlsafe_b64decode(cursor.encode()).decode()
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+    page = await services.run_graph_query(services.db_manager.get_graph_page, after=after, limit=limit)
+    next_after = page.pop("next_after")
+    page["next_cursor"] = base64.urlsafe_b64encode(next_after.encode()).decode() if next_after is not None else None
+    return page
+ 
+ 
+@router.get("/api/analytics/summary")
+async def analytics_summary(services: Services = Depends(get_services)):
+    """Graph size, cluster count and the version the analytics were computed for."""
+    snapshot = await services.run_graph_query(services.graph_analytics.get)
+    return {**snapshot.summary(), **services.graph_analytics.stats()}
+ 
+ 
+@router.get("/api/analytics/centrality")
+async def analytics_centrality(limit: int = Query(20, ge=1, le=1000), services: Services = Depends(get_services)):
+    """Most central institutions by PageRank over the relationship graph."""
+    snapshot = await services.run_graph_query(services.graph_analytics.get)
+    return {"version": snapshot.version, "institutions": snapshot.most_central(limit)}
+ 
+ 
+@router.get("/api/analytics/clusters")
+async def analytics_clusters(
+    limit: int = Query(20, ge=1, le=1000),
+    members: int = Query(10, ge=1, le=500),
+    services: Services = Depends(get_services),
+):
+    """Largest connected clusters of institutions, with their most central members."""
+    snapshot = await services.run_graph_query(services.graph_analytics.get)
+    return {"version": snapshot.version, "clusters": snapshot.clusters(limit, members)}
+ 
+ 
+@router.get("/api/analytics/contagion")
+async def analytics_contagion(limit: int = Query(20, ge=1, le=1000), services: Services = Depends(get_services)):
+    """
+    Institutions ranked by propagated risk: their own latest risk_score, or the
+    decayed score of a risky counterparty up to a few hops away, whichever is higher.
+    """
+    snapshot = await services.run_graph_query(services.graph_analytics.get)
+    return {"version": snapshot.version, "institutions": snapshot.contagion(limit)}
+ 
+ 
+@router.get("/api/analytics/institution/{company}")
+async def analytics_institution(company: str, services: Services = Depends(get_services)):
+    """Centrality, cluster and propagated risk of one institution."""
+    snapshot = await services.run_graph_query(services.graph_analytics.get)
+    record = snapshot.institution(company)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"{company} is not in the graph.")
+    return {"version": snapshot.version, **record}
+ 
+ 
+@router.get("/api/timeseries")
+def timeseries_tickers(services: Services = Depends(get_services)):
+    """Tickers with recorded market snapshots and risk scores."""
+    return {"tickers": services.timeseries.tickers(), "columns": list(TIMESERIES_COLUMNS)}
+ 
+ 
+@router.get("/api/timeseries/{ticker}")
+async def timeseries_history(
+    ticker: str,
+    start: Optional[float] = Query(None, description="Epoch seconds; defaults to `days` before end"),
+    end: Optional[float] = Query(None, description="Epoch seconds (exclusive); defaults to now"),
+    days: float = Query(30, gt=0, le=3660),
+    bucket: Optional[int] = Query(None, ge=1, description="Seconds per bucket for min/max/mean trends"),
+    columns: Optional[str] = Query(None, description="Comma-separated; defaults to all"),
+    services: Services = Depends(get_services),
+):
+    """
+    Recorded history for a ticker, column by column. Without `bucket` every sample
+    in [start, end) is returned; with it, one min/max/mean per bucket. Missing
+    values are null.
+    """
+    end = time.time() if end is None else end
+    start = end - days * 86400 if start is None else start
+    names = [name.strip() for name in columns.split(",") if name.strip()] if columns else list(TIMESERIES_COLUMNS)
+    unknown = [name for name in names if name not in TIMESERIES_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown column(s): {', '.join(unknown)}")
+    if bucket is None:
+        result = await services.timeseries_upstream.call(services.timeseries.scan, ticker, start, end, names)
+    else:
+        result = await services.timeseries_upstream.call(
+            services.timeseries.downsample, ticker, bucket, start, end, names
+        )
+    if bucket is None:
+        if len(result["ts"]) > MAX_TIMESERIES_POINTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"More than {MAX_TIMESERIES_POINTS} samples in range; narrow it or pass a bucket.",
+            )
+        payload = {"ticker": ticker, "start": start, "end": end, "ts": result.pop("ts"), "columns": result}
+    else:
+        payload = {
+            "ticker": ticker, "start": start, "end": end, "bucket": bucket,
+            "bucket_start": result.pop("bucket_start"), "count": result.pop("count"), "columns": result,
+        }
+    # orjson writes the NumPy columns directly, with NaN as null
+    return Response(content=orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY), media_type="application/json")
+ 
+ 
+@router.get("/api/cache_stats")
+def cache_stats(services: Services = Depends(get_services)):
+    """Returns hit/miss counters for the server-side caches."""
+    return services.cache_stats()
+ 
+ 
+@router.get("/api/upstream_stats")
+def upstream_stats(services: Services = Depends(get_services)):
+    """Returns call, in-flight and timeout counters for each upstream pool."""
+    return {u.name: u.stats() for u in services.upstreams}
+ 
+ 
+def register_metrics(services: Services):
+    # Pool and cache counters that are already kept elsewhere, read at scrape time.
+    # Registering again (a new app) replaces the previous callbacks.
+    for field in ("calls", "in_flight", "timeouts", "errors"):
+        REGISTRY.gauge_callback(
+            f"upstream_pool_{field}", f"Upstream pool {field.replace('_', ' ')} (see /api/upstream_stats).",
+            lambda field=field: {(u.name,): getattr(u, field) for u in services.upstreams}, ("upstream",),
+        )
+    REGISTRY.gauge_callback(
+        "event_subscribers", "Open /api/events streams.", lambda: {(): services.event_broker.stats()["subscribers"]},
+    )
+    for field in ("hits", "misses", "hit_ratio"):
+        REGISTRY.gauge_callback(
+            f"cache_{field}", f"Server-side cache {field.replace('_', ' ')} (see /api/cache_stats).",
+            lambda field=field: {(name,): stats.get(field) for name, stats in services.cache_stats().items()},
+            ("cache",),
+        )
+ 
+ 
+@router.get("/metrics")
+def prometheus_metrics():
+    """Upstream latency histograms, error counts, payload sizes and pool/cache gauges in Prometheus text format."""
+    return Response(content=REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+ 
+ 
+@router.get("/api/risk_alerts")
+async def bulk_risk_alerts(
+    companies: str = Query(..., description="Comma-separated company names"),
+    services: Services = Depends(get_services),
+):
+    """
+    Risk sweep over many companies: their data is fetched concurrently and scored
+    in one batch. Reports are sorted by risk_score, highest first.
+    """
+    names = list(dict.fromkeys(name.strip() for name in companies.split(",") if name.strip()))
+    if not names:
+        raise HTTPException(status_code=400, detail="At least one company is required.")
+    if len(names) > MAX_BULK_COMPANIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_COMPANIES} companies per request.")
+    # Assuming ticker is same as company for this example
+    results = await asyncio.gather(
+        *(services.fetch_company_data(name, name) for name in names), return_exceptions=True
+    )
+    available, unavailable = [], []
+    for name, result in zip(names, results):
+        if isinstance(result, Exception) or not (result["news_articles"] or result["market_data"]):
+            unavailable.append(name)
+        else:
+            available.append(result)
+    reports = services.cro_agent.assess_risk_many(available)
+    services.record_risk(available, reports)
+    reports.sort(key=lambda report: report["risk_score"], reverse=True)
+    return {"reports": reports, "unavailable": unavailable}
+ 
+ 
+@router.get("/api/risk_alerts/{company}")
+async def risk_alerts(company: str, services: Services = Depends(get_services)):
     """Assess the company's risk based on latest news and market data."""
     # Assuming ticker is same as company for this example
     ticker = company
-    latest_news = scout_agent.fetch_news(company)
-    market_data = scout_agent.fetch_market_data(ticker)
+    company_data = await services.fetch_company_data(company, ticker)
+    latest_news = company_data["news_articles"]
+    market_data = company_data["market_data"]
  
     if not latest_news and not market_data:
         raise HTTPException(status_code=404, detail="No data available for this company.")
- 
-    company_data = {
-        "company_name": company,
-        "news_articles": latest_news,
-        "market_data": market_data
-    }
-    report = cro_agent.assess_risk(company_data)
+    report = services.cro_agent.assess_risk(company_data)
+    services.record_risk([company_data], [report])
     return {"company": company, "risk_report": report}
  
  
-@app.get("/api/company_condition/{company}")
-def company_condition(company: str):
+@router.get("/api/company_condition/{company}")
+async def company_condition(company: str, services: Services = Depends(get_services)):
     """Return Gemini-generated analysis of company condition."""
     # Assuming ticker is same as company for this example
     ticker = company
-    latest_news = scout_agent.fetch_news(company)
-    market_data = scout_agent.fetch_market_data(ticker)
+    company_data = await services.fetch_company_data(company, ticker)
+    latest_news = company_data["news_articles"]
+    market_data = company_data["market_data"]
  
     if not latest_news and not market_data:
         raise HTTPException(status_code=404, detail="No data available for this company.")
- 
-    company_data = {
-        "company_name": company,
-        "news_articles": latest_news,
-        "market_data": market_data
-    }
-    report = cro_agent.analyze_company_condition(company_data)
+    report = await services.llm_upstream.call(services.cro_agent.analyze_company_condition, company_data)
     return {"company": company, "report": report, "news": latest_news, "market_data": market_data}
  
  
-@app.post("/api/simulate/{company}")
-def simulate(company: str, request: ScenarioRequest):
+@router.post("/api/simulate/{company}")
+async def simulate(company: str, request: ScenarioRequest, services: Services = Depends(get_services)):
     """Simulate a hypothetical scenario for a company."""
     scenario = request.scenario
     if not scenario:
         raise HTTPException(status_code=400, detail="Scenario description is required.")
-    result = cro_agent.simulate_scenario(company, scenario)
-    return {"company": company, "scenario": scenario, "simulation": result}
\ No newline at end of file
+    result = await services.llm_upstream.call(services.cro_agent.simulate_scenario, company, scenario)
+    return {"company": company, "scenario": scenario, "simulation": result}
+ 
+ 
+# --- Application factory ---
+def create_app(services: Services = None) -> FastAPI:
+    """
+    Builds the FastAPI app around `services` (built from get_settings() if not given).
+    Connections are warmed concurrently when the server starts and closed when it stops.
+    """
+    services = services or Services()
+    configure_logging(services.settings.log_level)
+ 
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await services.warm_up()
+        services.start_publishers()
+        try:
+            yield
+        finally:
+            await services.close()
+ 
+    app = FastAPI(lifespan=lifespan)
+    app.state.services = services
+    # --- Middleware ---
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_exception_handler(UpstreamTimeout, upstream_timeout_handler)
+    app.include_router(router)
+    register_metrics(services)
+    return app
+ 
+ 
+app = create_app()
@@ -0,0 +1,462 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for the upstreams, so the benchmarks run without Neo4j, NewsAPI,
+yfinance or Gemini. Every fake has a configurable latency per call.
+"""
+import bisect
+import functools
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from database import (
+    CREATE_EDGE_QUERY,
+    CREATE_NODE_QUERY,
+    CURRENT_VERSION_QUERY,
+    EXPORT_EDGES_QUERY,
+    EXPORT_NODES_QUERY,
+    GRAPH_EDGES_QUERY,
+    GRAPH_EDGES_SINCE_QUERY,
+    GRAPH_NODES_QUERY,
+    GRAPH_NODES_SINCE_QUERY,
+    NEIGHBORHOOD_CENTER_QUERY,
+    NEIGHBORHOOD_HOP_QUERY,
+    NEXT_VERSION_QUERY,
+    SCHEMA_MIGRATIONS,
+    SHOW_SCHEMA_QUERIES,
+    UPSERT_EDGES_QUERY,
+    UPSERT_NODES_QUERY,
+    DatabaseManager,
+)
+
+HEADLINE_TEMPLATES = [
+    "{company} shares rally after earnings beat",
+    "{company} expands partnership with Counterparty {n}",
+    "{company} faces lawsuit over disclosure",
+    "{company} warns of slower growth",
+    "{company} stock drops on guidance",
+    "{company} announces buyback",
+    "{company} hit by trading loss",
+    "{company} invests in Counterparty {n}",
+]
+RELATIONSHIP_TYPES = ["invested in", "acquired", "is a competitor to", "lent to", "partnered with"]
+
+
+class FakeNewsAPI:
+    """
+    ThreadingHTTPServer that answers NewsAPI /v2/everything requests. Each request
+    for a company returns `page_size` articles of which `fresh` are new, so the
+    fingerprint store sees a realistic mix of seen and unseen headlines.
+    """
+    def __init__(self, latency: float = 0.0, page_size: int = 5, fresh: int = 2):
+        self.latency = latency
+        self.page_size = page_size
+        self.fresh = fresh
+        self.requests = 0
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+        self._server = None
+
+    def _articles(self, company: str) -> list:
+        with self._lock:
+            self.requests += 1
+            self._counters[company] += self.fresh
+            newest = self._counters[company]
+        articles = []
+        for n in range(newest, newest - self.page_size, -1):
+            template = HEADLINE_TEMPLATES[zlib.crc32(f"{company}:{n}".encode()) % len(HEADLINE_TEMPLATES)]
+            title = template.format(company=company, n=n % 50) + f" (#{n})"
+            articles.append({
+                "source": {"name": "Fake Wire"},
+                "title": title,
+                "description": f"{title}. Details follow.",
+            })
+        return articles
+
+    def start(self) -> str:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                company = query.get("qInTitle", [""])[0]
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = json.dumps({"status": "ok", "articles": fake._articles(company)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-newsapi", daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v2/everything"
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def make_fake_download(latency: float = 0.0, bars: int = 78, interval_minutes: int = 5):
+    """
+    Returns a yfinance.download replacement producing `bars` intraday bars per
+    ticker in the (field, ticker) column layout, as a seeded random walk.
+    """
+    def download(tickers, period=None, interval=None, group_by="column", **kwargs):
+        if latency:
+            time.sleep(latency)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        end = pd.Timestamp.now(tz="UTC").floor(f"{interval_minutes}min")
+        index = pd.date_range(end=end, periods=bars, freq=f"{interval_minutes}min")
+        columns = {}
+        for ticker in tickers:
+            rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+            closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, bars)))
+            opens = np.concatenate(([100.0], closes[:-1]))
+            for field, values in (("Open", opens), ("High", np.maximum(opens, closes)),
+                                  ("Low", np.minimum(opens, closes)), ("Close", closes),
+                                  ("Volume", rng.integers(1000, 10000, bars).astype(float))):
+                columns[(field, ticker)] = values
+        frame = pd.DataFrame(columns, index=index)
+        frame.columns = pd.MultiIndex.from_tuples(frame.columns, names=["Price", "Ticker"])
+        return frame
+
+    return download
+
+
+class FakeGenerativeModel:
+    """
+    Stands in for genai.GenerativeModel. Answers the analyst (single and batched),
+    company condition and scenario prompts with schema-valid JSON derived from the
+    prompt, after sleeping `latency` seconds. Supports generation_config and stream.
+    """
+    def __init__(self, model_name: str = "gemini-1.5-flash", latency: float = 0.0, relationships: int = 3,
+                 counterparties: int = 200, **kwargs):
+        self.model_name = model_name
+        self.latency = latency
+        self.relationships = relationships
+        self.counterparties = counterparties
+
+    @staticmethod
+    def _contracts(prompt: str, marker: str):
+        body = prompt.split(marker, 1)[1].rsplit("---", 1)[0]
+        return json.loads(body)
+
+    def _analysis(self, contract: dict) -> dict:
+        company = contract.get("company_name") or "Unknown"
+        titles = "|".join(article.get("title") or "" for article in contract.get("news_articles") or [])
+        rng = random.Random(zlib.crc32(f"{company}|{titles}".encode()))
+        return {
+            "analysis": {
+                "company_name": company,
+                "ticker": contract.get("ticker"),
+                "summary": f"{company}: {len(contract.get('news_articles') or [])} new headline(s).",
+                "news_sentiment": {"direct_impact_on_jpm": "neutral", "indirect_impact_on_jpm": "neutral"},
+                "market_data_summary": "Synthetic market data.",
+            },
+            "key_figures_mentioned": {
+                "jpm_market_data": contract.get("market_data"),
+                "other_company_targets_by_jpm": [],
+            },
+            "relationships": [
+                {
+                    "source_entity": company,
+                    "target_entity": f"Counterparty {rng.randrange(self.counterparties)}",
+                    "relationship_type": rng.choice(RELATIONSHIP_TYPES),
+                }
+                for _ in range(self.relationships)
+            ],
+            "market_impact_score": rng.randint(1, 10),
+        }
+
+    def _respond(self, prompt: str) -> dict:
+        if "DATA CONTRACTS TO ANALYZE:" in prompt:
+            contracts = self._contracts(prompt, "DATA CONTRACTS TO ANALYZE:")
+            return {"analyses": [self._analysis(contract) for contract in contracts]}
+        if "DATA CONTRACT TO ANALYZE:" in prompt:
+            return self._analysis(self._contracts(prompt, "DATA CONTRACT TO ANALYZE:"))
+        if "predicted_risk_score" in prompt:
+            return {"predicted_risk_score": 6, "potential_impact": "Moderate.", "suggested_actions": ["Hedge."]}
+        return {"overall_condition": "Stable.", "impact_analysis": "Limited.", "recommendations": "Monitor."}
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        text = json.dumps(self._respond(prompt))
+        if stream:
+            return [SimpleNamespace(text=text[i:i + 64]) for i in range(0, len(text), 64)]
+        return SimpleNamespace(text=text)
+
+
+def _statement(query: str) -> str:
+    # Cypher text with whitespace collapsed, so constants match however they're indented
+    return " ".join(query.split())
+
+
+class FakeResult:
+    """
+    The parts of neo4j.Result the DatabaseManager uses: iteration over records,
+    single() and consume().counters. Records are plain dicts with a data() method.
+    """
+    def __init__(self, records=(), nodes_created: int = 0, relationships_created: int = 0):
+        self._records = records
+        self._counters = SimpleNamespace(nodes_created=nodes_created, relationships_created=relationships_created)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self):
+        for record in self._records:
+            return record
+        return None
+
+    def consume(self):
+        return SimpleNamespace(counters=self._counters)
+
+
+class FakeRecord(dict):
+    def data(self) -> dict:
+        return dict(self)
+
+
+class FakeGraph:
+    """
+    An in-memory stand-in for the Neo4j server. It answers the statements in
+    database.py, recognised by their text, against a graph held in dicts. Any
+    other statement raises, so a new query shows up here instead of going
+    unmeasured. Every statement sleeps `latency` seconds to stand in for the
+    round trip. Write transactions run one at a time, as they do behind the
+    GraphMeta version lock. They are not rolled back on failure.
+    """
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.statements = 0
+        self.schema = set()
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._version = 0
+        self._next_id = 0
+        # Rows are kept as the records the read statements return, so serving them
+        # costs next to nothing and the benchmarks time DatabaseManager, not the fake
+        self._nodes = {}  # name -> {"id", "label"}
+        self._names = []  # sorted, for keyset pagination
+        self._node_names = {}  # id -> name
+        self._edges = {}  # (source, target, type) -> {"id", "from", "to", "label"}
+        self._versions = {}  # node or edge id -> graph version that created it
+        self._incident = defaultdict(list)  # node id -> edge keys touching it
+        self._handlers = {_statement(query): handler for query, handler in [
+            (NEXT_VERSION_QUERY, self._next_version),
+            (CURRENT_VERSION_QUERY, self._current_version),
+            (CREATE_NODE_QUERY, self._create_node),
+            (CREATE_EDGE_QUERY, self._create_edge),
+            (UPSERT_NODES_QUERY, self._upsert_nodes),
+            (UPSERT_EDGES_QUERY, self._upsert_edges),
+            (GRAPH_NODES_QUERY, lambda: self._graph_nodes(-1)),
+            (GRAPH_EDGES_QUERY, lambda: self._graph_edges(-1)),
+            (GRAPH_NODES_SINCE_QUERY, self._graph_nodes),
+            (GRAPH_EDGES_SINCE_QUERY, self._graph_edges),
+            (NEIGHBORHOOD_CENTER_QUERY, self._center),
+            (NEIGHBORHOOD_HOP_QUERY, self._hop),
+            (EXPORT_NODES_QUERY, self._export_nodes),
+            (EXPORT_EDGES_QUERY, self._export_edges),
+            *[(query, self._show_schema) for query in SHOW_SCHEMA_QUERIES],
+            *[(statement, functools.partial(self.schema.add, name)) for name, statement in SCHEMA_MIGRATIONS],
+        ]}
+
+    def run(self, query: str, parameters: dict):
+        handler = self._handlers.get(_statement(query))
+        if handler is None:
+            raise NotImplementedError(f"FakeGraph does not know this statement: {_statement(query)}")
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.statements += 1
+            result = handler(**parameters)
+        return result if isinstance(result, FakeResult) else FakeResult(result or ())
+
+    # --- Writes ---
+    def _merge_node(self, name: str, version: int) -> bool:
+        if name in self._nodes:
+            return False
+        self._next_id += 1
+        self._nodes[name] = FakeRecord(id=self._next_id, label=name)
+        self._node_names[self._next_id] = name
+        self._versions[self._next_id] = version
+        bisect.insort(self._names, name)
+        return True
+
+    def _merge_edge(self, source: str, target: str, relationship_type: str, version: int) -> bool:
+        key = (source, target, relationship_type)
+        if key in self._edges:
+            return False
+        self._next_id += 1
+        source_id, target_id = self._nodes[source]["id"], self._nodes[target]["id"]
+        self._edges[key] = FakeRecord({"id": self._next_id, "from": source_id, "to": target_id, "label": relationship_type})
+        self._versions[self._next_id] = version
+        self._incident[source_id].append(key)
+        if target_id != source_id:
+            self._incident[target_id].append(key)
+        return True
+
+    def _next_version(self):
+        self._version += 1
+        return [FakeRecord(version=self._version)]
+
+    def _current_version(self):
+        return [FakeRecord(version=self._version)]
+
+    def _create_node(self, name, version):
+        created = self._merge_node(name, version)
+        return FakeResult([FakeRecord(i=self._nodes[name])], nodes_created=int(created))
+
+    def _create_edge(self, source_name, target_name, relationship_type, version):
+        if source_name not in self._nodes or target_name not in self._nodes:
+            return None
+        return FakeResult(relationships_created=int(self._merge_edge(source_name, target_name, relationship_type, version)))
+
+    def _upsert_nodes(self, names, version):
+        return FakeResult(nodes_created=sum(self._merge_node(name, version) for name in names))
+
+    def _upsert_edges(self, edges, version):
+        nodes_created = relationships_created = 0
+        for edge in edges:
+            nodes_created += self._merge_node(edge["source"], version)
+            nodes_created += self._merge_node(edge["target"], version)
+            relationships_created += self._merge_edge(edge["source"], edge["target"], edge["type"], version)
+        return FakeResult(nodes_created=nodes_created, relationships_created=relationships_created)
+
+    def _show_schema(self):
+        return [FakeRecord(name=name) for name in self.schema]
+
+    # --- Reads ---
+    def _newer(self, records, since):
+        if since < 0:
+            return list(records)
+        versions = self._versions
+        return [record for record in records if versions[record["id"]] > since]
+
+    def _graph_nodes(self, since):
+        return self._newer(self._nodes.values(), since)
+
+    def _graph_edges(self, since):
+        return self._newer(self._edges.values(), since)
+
+    def _center(self, name):
+        node = self._nodes.get(name)
+        return [node] if node is not None else []
+
+    def _hop(self, ids, seen, limit):
+        frontier, seen, records = set(ids), set(seen), []
+        for node_id in ids:
+            for key in self._incident[node_id]:
+                edge = self._edges[key]
+                if edge["id"] in seen:
+                    continue
+                seen.add(edge["id"])
+                neighbor_id = edge["to"] if edge["from"] in frontier else edge["from"]
+                records.append(FakeRecord(edge, neighbor_id=neighbor_id, neighbor_label=self._node_names[neighbor_id]))
+                if len(records) >= limit:
+                    return records
+        return records
+
+    def _export_nodes(self, after, limit):
+        start = bisect.bisect_right(self._names, after)
+        return [self._nodes[name] for name in self._names[start:start + limit]]
+
+    def _export_edges(self, ids):
+        return [
+            self._edges[key]
+            for node_id in ids for key in self._incident[node_id]
+            if self._edges[key]["from"] == node_id
+        ]
+
+
+class FakeTransaction:
+    def __init__(self, graph: FakeGraph):
+        self._graph = graph
+
+    def run(self, query, parameters=None, **kwargs):
+        return self._graph.run(query, {**(parameters or {}), **kwargs})
+
+
+class FakeSession:
+    """
+    A neo4j session over a FakeGraph, with managed read and write transactions.
+    """
+    def __init__(self, graph: FakeGraph):
+        self._graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(FakeTransaction(self._graph), *args, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        with self._graph._write_lock:
+            return work(FakeTransaction(self._graph), *args, **kwargs)
+
+
+class FakeDriver:
+    def __init__(self, graph: FakeGraph):
+        self.graph = graph
+
+    def session(self, database=None, default_access_mode=None):
+        return FakeSession(self.graph)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class InMemoryDatabaseManager(DatabaseManager):
+    """
+    The real DatabaseManager, with a FakeDriver in place of the neo4j driver. Every
+    method runs as it does in production: the Cypher statements, UNWIND batching,
+    transaction boundaries, keyset pagination and the neighbourhood BFS. Only the
+    server is faked, by FakeGraph. Each statement sleeps `latency` seconds to stand
+    in for the round trip.
+    """
+    def __init__(self, latency: float = 0.0, max_concurrency: int = None, acquisition_timeout: float = 30.0):
+        super().__init__("bolt://benchmark", "neo4j", "benchmark", max_concurrency=max_concurrency,
+                         connection_acquisition_timeout=acquisition_timeout)
+        self.graph = FakeGraph(latency)
+        self._driver_instance = FakeDriver(self.graph)
+
+    def close(self):
+        # The graph lives in this process; keep it (and the fake driver) until it's garbage
+        pass
+
+
+def install_fakes(llm_latency: float = 0.0, market_latency: float = 0.0):
+    """
+    Points google.generativeai and yfinance at the fakes. Call before the agents
+    build their Gemini model (on first use) or fetch quotes.
+    """
+    import google.generativeai as genai
+    import yfinance
+
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    genai.GenerativeModel = functools.partial(FakeGenerativeModel, latency=llm_latency)
+    yfinance.download = make_fake_download(latency=market_latency)
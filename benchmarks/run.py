@@ -0,0 +1,477 @@
+# benchmarks/run.py
+"""
+End-to-end benchmarks against the local fakes in benchmarks/fakes.py.
+
+    python -m benchmarks.run [--output benchmarks/results.json] [--baseline old.json]
+
+Measures latency percentiles and throughput for the api.py endpoints (in process,
+over ASGI), encoding the /api/graph_data body, NetworkAnalystAgent ingest into the
+graph, the headless vansh pipeline and the time-series store. Results are written as JSON; with --baseline the run exits non-zero if
+any benchmark got slower or lost throughput beyond --tolerance.
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from metrics import configure_logging
+from timeseries import SECONDS_PER_DAY
+from benchmarks.fakes import FakeGenerativeModel, FakeNewsAPI, InMemoryDatabaseManager, install_fakes
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    """
+    Latency percentiles (ms) and throughput for one benchmark.
+    """
+    if not latencies:
+        return {"count": 0, "elapsed_sec": round(elapsed, 4), "throughput_per_sec": 0.0}
+    ms = np.asarray(latencies) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        "count": len(latencies),
+        "elapsed_sec": round(elapsed, 4),
+        "throughput_per_sec": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p90_ms": round(float(p90), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def company_names(count: int) -> list:
+    return [f"Company {i:03d}" for i in range(count)]
+
+
+def seed_graph(db, companies: list, relationships: int, seed: int = 7):
+    # Roughly what a few rounds of analyses leave behind
+    rng = random.Random(seed)
+    model = FakeGenerativeModel(relationships=relationships)
+    for company in companies:
+        contract = {"company_name": company, "news_articles": [{"title": f"seed {rng.random()}"}]}
+        db.upsert_graph([company], [
+            (rel["source_entity"], rel["target_entity"], rel["relationship_type"])
+            for rel in model._analysis(contract)["relationships"]
+        ])
+
+
+# --- api.py ---
+async def _drive(client, method: str, path_for, requests: int, concurrency: int, **kwargs) -> dict:
+    latencies = []
+    statuses = collections.Counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path_for(i), **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+async def _broadcast(events: int, subscribers: int) -> dict:
+    # Time from publish() until every /api/events subscriber has read the event
+    from events import EventBroker
+
+    broker = EventBroker(queue_size=events + 1)
+    pending = {"count": 0}
+    delivered = asyncio.Event()
+
+    async def consume():
+        async for message in broker.stream():
+            if message.startswith(b"id:"):
+                pending["count"] -= 1
+                if pending["count"] == 0:
+                    delivered.set()
+
+    consumers = [asyncio.create_task(consume()) for _ in range(subscribers)]
+    await asyncio.sleep(0)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(events):
+        delivered.clear()
+        pending["count"] = subscribers
+        call_started = time.perf_counter()
+        broker.publish("graph", {"nodes": [], "edges": [], "cursor": i + 1, "since": i, "full": False})
+        await delivered.wait()
+        latencies.append(time.perf_counter() - call_started)
+    result = summarize(latencies, time.perf_counter() - started)
+    for consumer in consumers:
+        consumer.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+    result["subscribers"] = subscribers
+    return result
+
+
+def bench_api(args, news_url: str) -> dict:
+    import httpx
+
+    import api
+    from agents import CachedScoutAgent
+    from timeseries import TimeSeriesStore
+
+    companies = company_names(args.companies)
+    db = InMemoryDatabaseManager(latency=args.db_latency, max_concurrency=16)
+    seed_graph(db, companies, args.relationships)
+    # ASGITransport doesn't run the lifespan, so there's no warm-up and no publishers;
+    # time-series samples stay pending and are read back from memory
+    timeseries_dir = tempfile.TemporaryDirectory()
+    services = api.Services(
+        db_manager=db, scout_agent=CachedScoutAgent(news_api_url=news_url),
+        timeseries=TimeSeriesStore(timeseries_dir.name, batch_size=None, flush_interval=None),
+    )
+    app = api.create_app(services)
+
+    def company(i):
+        return companies[i % len(companies)]
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            # httpx asks for gzip by default; the plain cases opt out to measure the uncompressed path
+            identity = {"Accept-Encoding": "identity"}
+            etag = (await client.get("/api/graph_data", headers=identity)).headers["etag"]
+            since = max(0, db.get_graph_version() - 1)
+            bulk = ",".join(companies[:20])
+            cases = [
+                ("graph_data_full", "GET", lambda i: "/api/graph_data", {"headers": identity}),
+                ("graph_data_not_modified", "GET", lambda i: "/api/graph_data",
+                 {"headers": {**identity, "If-None-Match": etag}}),
+                ("graph_data_delta", "GET", lambda i: f"/api/graph_data?since={since}", {"headers": identity}),
+                ("graph_data_gzip", "GET", lambda i: "/api/graph_data", {"headers": {"Accept-Encoding": "gzip"}}),
+                ("graph_data_compact", "GET", lambda i: "/api/graph_data?format=compact", {"headers": identity}),
+                ("neighborhood", "GET", lambda i: f"/api/graph/neighborhood/{company(i)}", {}),
+                ("export_page", "GET", lambda i: "/api/graph/export?limit=200", {}),
+                ("risk_alerts", "GET", lambda i: f"/api/risk_alerts/{company(i)}", {}),
+                ("risk_alerts_bulk", "GET", lambda i: f"/api/risk_alerts?companies={bulk}", {}),
+                # After the risk sweeps, so contagion has seeds
+                ("analytics_centrality", "GET", lambda i: "/api/analytics/centrality", {}),
+                ("analytics_contagion", "GET", lambda i: "/api/analytics/contagion", {}),
+                ("analytics_institution", "GET", lambda i: f"/api/analytics/institution/{company(i)}", {}),
+                ("timeseries_trend", "GET", lambda i: f"/api/timeseries/{company(i)}?bucket=3600", {}),
+                ("company_condition", "GET", lambda i: f"/api/company_condition/{company(i)}", {}),
+                ("simulate", "POST", lambda i: f"/api/simulate/{company(i)}",
+                 {"json": {"scenario": "Rates rise 2 points"}}),
+            ]
+            results = {}
+            for name, method, path_for, kwargs in cases:
+                results[f"api.{name}"] = await _drive(
+                    client, method, path_for, args.requests, args.concurrency, **kwargs
+                )
+        results["api.events_broadcast"] = await _broadcast(args.requests, args.subscribers)
+        return results
+
+    try:
+        return asyncio.run(run())
+    finally:
+        timeseries_dir.cleanup()
+
+
+# --- /api/graph_data encoding ---
+def bench_graph_encoding(args) -> dict:
+    # Cache-miss cost of building the /api/graph_data body on a large graph
+    import zlib
+
+    import orjson
+
+    from graphformat import CompactGraphWriter, JsonGraphWriter
+
+    rng = random.Random(7)
+    names = [f"Institution {i:06d}" for i in range(args.graph_nodes)]
+    types = ["acquired", "invested in", "partnered with", "lends to", "supplies"]
+    db = InMemoryDatabaseManager()
+    db.upsert_graph(names, [
+        (rng.choice(names), rng.choice(names), rng.choice(types)) for _ in range(args.graph_edges)
+    ])
+    encoders = {
+        "dicts": lambda: orjson.dumps(db.get_graph()),
+        "json": lambda: db.encode_graph(JsonGraphWriter).body(),
+        "compact": lambda: db.encode_graph(CompactGraphWriter).body(),
+    }
+    results = {}
+    for name, encode in encoders.items():
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.graph_rounds):
+            call_started = time.perf_counter()
+            body = encode()
+            latencies.append(time.perf_counter() - call_started)
+        result = summarize(latencies, time.perf_counter() - started)
+        result["bytes"] = len(body)
+        result["gzip_bytes"] = len(zlib.compress(body, 6))
+        results[f"graph_encoding.{name}"] = result
+    return results
+
+
+# --- NetworkAnalystAgent ingest ---
+def bench_ingest(args) -> dict:
+    from NetworkAnalystAgent import NetworkAnalystAgent
+
+    companies = company_names(args.companies)
+    model = FakeGenerativeModel(relationships=args.relationships)
+    analyses = [
+        (model._analysis({"company_name": companies[i % len(companies)], "news_articles": [{"title": f"headline {i}"}]}),
+         companies[i % len(companies)])
+        for i in range(args.analyses)
+    ]
+    results = {}
+
+    agent = NetworkAnalystAgent(InMemoryDatabaseManager(latency=args.db_latency))
+    latencies = []
+    started = time.perf_counter()
+    for analysis_data, company in analyses:
+        call_started = time.perf_counter()
+        agent.process_and_store(analysis_data, company)
+        latencies.append(time.perf_counter() - call_started)
+    results["ingest.process_and_store"] = summarize(latencies, time.perf_counter() - started)
+
+    agent = NetworkAnalystAgent(InMemoryDatabaseManager(latency=args.db_latency))
+    latencies = []
+    started = time.perf_counter()
+    for i in range(0, len(analyses), args.ingest_batch_size):
+        batch = analyses[i:i + args.ingest_batch_size]
+        call_started = time.perf_counter()
+        agent.process_and_store_many(batch)
+        # Each analysis in the batch waited for the whole batch
+        latencies.extend([time.perf_counter() - call_started] * len(batch))
+    results["ingest.process_and_store_many"] = summarize(latencies, time.perf_counter() - started)
+    return results
+
+
+# --- vansh pipeline ---
+def bench_pipeline(args, news_url: str) -> dict:
+    from agents import ScoutAgent
+    from fingerprints import FingerprintStore
+    from NetworkAnalystAgent import NetworkAnalystAgent
+    from rohan import AnalystAgent
+    from scheduler import RateLimiter, WatchItem
+    from timeseries import TimeSeriesStore
+    from vansh import build_pipeline
+
+    with open(os.path.join(os.path.dirname(__file__), "..", "watchlist.example.json"), encoding="utf-8") as f:
+        pipeline_config = json.load(f).get("pipeline", {})
+
+    submitted = collections.defaultdict(collections.deque)
+    latencies = []
+    network_agent = NetworkAnalystAgent(InMemoryDatabaseManager(latency=args.db_latency))
+    store_many = network_agent.process_and_store_many
+
+    def timed_store_many(analyses):
+        counts = store_many(analyses)
+        now = time.perf_counter()
+        for _, company in analyses:
+            if submitted[company]:
+                latencies.append(now - submitted[company].popleft())
+        return counts
+
+    network_agent.process_and_store_many = timed_store_many
+    items = [WatchItem(name, f"C{i:03d}", interval=0) for i, name in enumerate(company_names(args.companies))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fingerprint_store = FingerprintStore(os.path.join(tmp, "fingerprints.sqlite3"))
+        timeseries = TimeSeriesStore(os.path.join(tmp, "timeseries"))
+        scout_agent = ScoutAgent(news_api_url=news_url)
+        pipeline = build_pipeline(
+            pipeline_config, scout_agent, AnalystAgent(), network_agent, fingerprint_store,
+            RateLimiter(per_minute=6_000_000), timeseries,
+        )
+        pipeline.start()
+        started = time.perf_counter()
+        for _ in range(args.pipeline_rounds):
+            for item in items:
+                submitted[item.company_name].append(time.perf_counter())
+                pipeline.submit(item)
+        pipeline.stop()
+        elapsed = time.perf_counter() - started
+        scout_agent.close()
+        fingerprint_store.close()
+        timeseries.close()
+
+    result = summarize(latencies, elapsed)
+    result["submitted"] = len(items) * args.pipeline_rounds
+    result["stages"] = pipeline.stats()
+    return {"pipeline.watchlist": result}
+
+
+# --- Time-series store ---
+def bench_timeseries(args) -> dict:
+    from timeseries import TimeSeriesStore, snapshot_row
+
+    tickers = [f"T{i:03d}" for i in range(args.companies)]
+    rng = np.random.default_rng(7)
+    step = SECONDS_PER_DAY // args.samples_per_day
+    origin = int(time.time()) // SECONDS_PER_DAY * SECONDS_PER_DAY - args.history_days * SECONDS_PER_DAY
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # One flush per simulated day, as the pipeline's store stage would batch them
+        store = TimeSeriesStore(tmp, batch_size=None, flush_interval=None)
+        latencies = []
+        started = time.perf_counter()
+        for day in range(args.history_days):
+            for sample in range(args.samples_per_day):
+                ts = origin + day * SECONDS_PER_DAY + sample * step
+                prices = 100 + rng.normal(size=len(tickers)).cumsum()
+                store.append([
+                    snapshot_row(ticker, {"current_price": price, "change_percent_24h": price / 100 - 1},
+                                 risk_score=int(price) % 10, ts=ts)
+                    for ticker, price in zip(tickers, prices)
+                ])
+            call_started = time.perf_counter()
+            store.flush()
+            latencies.append(time.perf_counter() - call_started)
+        result = summarize(latencies, time.perf_counter() - started)
+        result["rows_per_sec"] = round(store.rows_written / result["elapsed_sec"], 1)
+        results["timeseries.append_flush_day"] = result
+
+        end = origin + args.history_days * SECONDS_PER_DAY
+
+        def run_queries(name, reader, query):
+            latencies = []
+            started = time.perf_counter()
+            for ticker in tickers:
+                call_started = time.perf_counter()
+                query(reader, ticker)
+                latencies.append(time.perf_counter() - call_started)
+            results[f"timeseries.{name}"] = summarize(latencies, time.perf_counter() - started)
+
+        def trend(reader, ticker):
+            reader.downsample(ticker, SECONDS_PER_DAY, origin, end)
+
+        # A fresh reader has nothing decoded yet, like a restarted API worker
+        reader = TimeSeriesStore(tmp)
+        run_queries("trend_cold", reader, trend)
+        run_queries("trend_warm", reader, trend)
+        run_queries("scan_last_day", reader, lambda reader, ticker: reader.scan(ticker, end - SECONDS_PER_DAY, end))
+    return results
+
+
+# --- Results ---
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(benchmarks: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns a message for every benchmark whose p50 latency grew, or whose
+    throughput dropped, by more than `tolerance` (a fraction) against the baseline.
+    """
+    regressions = []
+    for name, old in baseline.get("benchmarks", {}).items():
+        new = benchmarks.get(name)
+        if not new or not new.get("count") or not old.get("count"):
+            continue
+        if new["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {old['p50_ms']}ms -> {new['p50_ms']}ms")
+        if new["throughput_per_sec"] < old["throughput_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['throughput_per_sec']}/s -> {new['throughput_per_sec']}/s")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks against local fake upstreams.")
+    parser.add_argument("--only", default="api,graph,ingest,pipeline,timeseries", help="Comma-separated suites to run.")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results.json"))
+    parser.add_argument("--baseline", help="Earlier results file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed regression as a fraction.")
+    parser.add_argument("--companies", type=int, default=100)
+    parser.add_argument("--relationships", type=int, default=3, help="Relationships per fake analysis.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per API endpoint.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent API requests.")
+    parser.add_argument("--subscribers", type=int, default=100, help="Open event streams in the broadcast benchmark.")
+    parser.add_argument("--graph-nodes", type=int, default=20000, help="Institutions in the graph encoding benchmark.")
+    parser.add_argument("--graph-edges", type=int, default=100000, help="Relationships in the graph encoding benchmark.")
+    parser.add_argument("--graph-rounds", type=int, default=10, help="Encodings per format.")
+    parser.add_argument("--analyses", type=int, default=500, help="Analyses to ingest.")
+    parser.add_argument("--ingest-batch-size", type=int, default=20)
+    parser.add_argument("--pipeline-rounds", type=int, default=1)
+    parser.add_argument("--history-days", type=int, default=90, help="Days of time-series history to write.")
+    parser.add_argument("--samples-per-day", type=int, default=24, help="Time-series samples per ticker per day.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake Gemini call.")
+    parser.add_argument("--news-latency", type=float, default=0.02, help="Seconds per fake NewsAPI request.")
+    parser.add_argument("--market-latency", type=float, default=0.05, help="Seconds per fake yfinance download.")
+    parser.add_argument("--db-latency", type=float, default=0.002, help="Seconds per fake graph transaction.")
+    parser.add_argument("--verbose", action="store_true", help="Keep the agents' console output.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    suites = {name.strip() for name in args.only.split(",") if name.strip()}
+    install_fakes(llm_latency=args.llm_latency, market_latency=args.market_latency)
+    news_api = FakeNewsAPI(latency=args.news_latency)
+    news_url = news_api.start()
+
+    # Runs before api.create_app(), whose own configure_logging() is then a no-op
+    configure_logging(None if args.verbose else "WARNING")
+
+    benchmarks = {}
+    stdout = sys.stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(stdout if args.verbose else devnull):
+        if "api" in suites:
+            benchmarks.update(bench_api(args, news_url))
+        if "graph" in suites:
+            benchmarks.update(bench_graph_encoding(args))
+        if "ingest" in suites:
+            benchmarks.update(bench_ingest(args))
+        if "pipeline" in suites:
+            benchmarks.update(bench_pipeline(args, news_url))
+        if "timeseries" in suites:
+            benchmarks.update(bench_timeseries(args))
+    news_api.stop()
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "benchmarks": benchmarks,
+    }
+    output_dir = os.path.dirname(args.output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    for name, stats in benchmarks.items():
+        print(f"{name:40s} {stats.get('throughput_per_sec', 0):>10}/s  "
+              f"p50={stats.get('p50_ms', '-')}ms  p99={stats.get('p99_ms', '-')}ms")
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(benchmarks, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(*parts) -> str:
+    """
+    Stable hash of JSON-serialisable inputs, for content-addressed cache keys.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SqliteStore:
+    """
+    On-disk second tier for TTLCache so entries survive restarts. Values must be
+    JSON-serialisable. Expiry uses wall-clock time, and the oldest-used rows are
+    pruned once the table grows past `maxsize`.
+
+    The database file (and its directory) is only created on first use, so
+    constructing a store touches nothing on disk.
+    """
+    def __init__(self, path: str, maxsize: int = 10000):
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _conn(self):
+        # Caller must hold the lock
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def get(self, key):
+        # Returns (value, seconds_left) or None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET used_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0]), row[1] - now
+
+    def set(self, key, value, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, used_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            conn, self._connection = self._connection, None
+        if conn is not None:
+            conn.close()
+
+
+class _InFlight:
+    """
+    A load that is currently running; concurrent callers for the same key wait on it.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache with per-entry expiry and LRU eviction.
+
+    get_or_load() coalesces concurrent misses: while one thread runs the loader for
+    a key, other threads asking for the same key wait for its result instead of
+    calling the upstream again, for at most `wait_timeout` seconds. An optional
+    `store` (e.g. SqliteStore) acts as a persistent second tier behind the in-memory
+    LRU. It is read without holding the cache lock, so memory hits never wait on disk.
+    """
+    def __init__(self, ttl: float, maxsize: int = 1024, store=None, wait_timeout: float = 60.0):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.store = store
+        self.wait_timeout = wait_timeout
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        # Caller must hold the lock. Returns (found, value) from memory only.
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def _from_store(self, key):
+        # Caller must not hold the lock. Returns (found, value) and promotes a
+        # stored entry into memory, unless another thread put a value there first.
+        if self.store is None:
+            return False, None
+        stored = self.store.get(key)
+        if stored is None:
+            return False, None
+        value, seconds_left = stored
+        with self._lock:
+            found, current = self._lookup(key)
+            if found:
+                return True, current
+            self._put(key, value, time.monotonic() + seconds_left)
+        return True, value
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+        found, value = self._from_store(key)
+        with self._lock:
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def _put(self, key, value, expires_at):
+        # Caller must hold the lock
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._put(key, value, time.monotonic() + ttl)
+        if self.store is not None:
+            self.store.set(key, value, ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+        if self.store is not None:
+            self.store.delete(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def get_or_load(self, key, loader, ttl: float = None, cache_if=None):
+        """
+        Returns the cached value for `key`, or calls `loader()` to produce it.
+        `cache_if(value)` can veto storing a result (e.g. to skip error responses).
+        A caller waiting on another thread's load raises TimeoutError after
+        `wait_timeout` seconds instead of holding its worker indefinitely.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if not call.event.wait(self.wait_timeout):
+                raise TimeoutError(f"No result for a concurrent load of the same key within {self.wait_timeout}s.")
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            found, call.value = self._from_store(key)
+            with self._lock:
+                if found:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if found:
+                return call.value
+            call.value = loader()
+            if cache_if is None or cache_if(call.value):
+                self.set(key, call.value, ttl)
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            call.event.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "persistent": self.store is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
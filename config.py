@@ -0,0 +1,62 @@
+# config.py
+import os
+import threading
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+DEFAULT_GEMINI_MODEL = "gemini-1.5-flash"
+
+
+class Settings:
+    """
+    Configuration shared by the API and the monitoring loop. Use get_settings(),
+    which loads .env and reads the environment once per process.
+
+    Nothing here is required at import time: a missing GEMINI_API_KEY only raises
+    when a Gemini model is first needed (see generative_model).
+    """
+    def __init__(self, environ=None):
+        env = os.environ if environ is None else environ
+        self.gemini_api_key = env.get("GEMINI_API_KEY")
+        self.gemini_model = env.get("GEMINI_MODEL", DEFAULT_GEMINI_MODEL)
+        self.news_api_key = env.get("NEWS_API_KEY")
+        self.neo4j_uri = env.get("NEO4J_URI", "bolt://localhost:7687")
+        self.neo4j_user = env.get("NEO4J_USER", "neo4j")
+        self.neo4j_password = env.get("NEO4J_PASSWORD", "password")
+        self.neo4j_database = env.get("NEO4J_DATABASE") or None
+        # Set to keep Gemini answers on disk across restarts
+        self.llm_cache_path = env.get("LLM_CACHE_PATH") or None
+        # Market snapshots and risk scores history (see timeseries.py)
+        self.timeseries_path = env.get("TIMESERIES_PATH", ".cache/timeseries")
+        self.log_level = env.get("LOG_LEVEL", "INFO")
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    load_dotenv()
+    return Settings()
+
+
+_genai_lock = threading.Lock()
+_genai_configured = False
+
+
+def generative_model(model_name: str = None):
+    """
+    Returns a Gemini GenerativeModel. google.generativeai is imported and
+    configured with the API key on the first call rather than at import, so
+    modules that use Gemini can be imported without credentials.
+    Raises ValueError if GEMINI_API_KEY is not set.
+    """
+    global _genai_configured
+    import google.generativeai as genai
+
+    settings = get_settings()
+    with _genai_lock:
+        if not _genai_configured:
+            if not settings.gemini_api_key:
+                raise ValueError("GEMINI_API_KEY not found in the environment or .env file.")
+            genai.configure(api_key=settings.gemini_api_key)
+            _genai_configured = True
+    return genai.GenerativeModel(model_name or settings.gemini_model)
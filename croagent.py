@@ -1,54 +1,53 @@
 # croagent.py
-import os
 import json
-import google.generativeai as genai
-from dotenv import load_dotenv
- 
-load_dotenv()
-API_KEY = os.getenv("GEMINI_API_KEY")
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file.")
-genai.configure(api_key=API_KEY)
+
+from cache import TTLCache, content_key
+from config import DEFAULT_GEMINI_MODEL, generative_model
+from response_parsing import CompanyCondition, ScenarioSimulation, StructuredOutputError, generate_structured
+from riskengine import RiskEngine
  
+def _is_success(result: dict) -> bool:
+    # Error payloads are returned to the caller but never cached
+    return "error" not in result
+
+
 class CROAgent:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+    def __init__(self, cache: TTLCache = None, model_name: str = DEFAULT_GEMINI_MODEL):
+        self.model_name = model_name
+        self._model = None
+        # Gemini answers are keyed by a hash of their prompt inputs, so repeated polls
+        # with unchanged news/market data (or re-run scenarios) reuse the last answer
+        self.cache = cache if cache is not None else TTLCache(ttl=600, maxsize=256)
+        self.risk_engine = RiskEngine()
  
-    def assess_risk(self, company_data: dict) -> dict:
-        company_name = company_data.get("company_name", "N/A")
-        news = company_data.get("news_articles", [])
-        market_data = company_data.get("market_data", {})
-        risk_score = 0
-        summary = "No significant risk detected."
+    @property
+    def model(self):
+        # Built on first use so importing or constructing the agent needs no API key.
+        # Two threads racing here just build the same model twice.
+        if self._model is None:
+            self._model = generative_model(self.model_name)
+        return self._model
+ 
+    def warm_up(self):
+        """
+        Configures Gemini and builds the model ahead of the first request.
+        """
+        return self.model
  
-        if news:
-            headline = news[0].get("title", "").lower()
-            if any(word in headline for word in ["crash", "downfall", "lawsuit", "scandal", "loss"]):
-                risk_score = 8
-                summary = f"High risk detected due to headline: {headline}"
-            elif any(word in headline for word in ["drop", "decline", "warning"]):
-                risk_score = 5
-                summary = f"Medium risk detected due to headline: {headline}"
-            else:
-                risk_score = 2
-                summary = f"Low risk. Latest news headline: {headline}"
+    def assess_risk(self, company_data: dict) -> dict:
+        return self.risk_engine.score(company_data)
  
-        if market_data:
-            change_percent = market_data.get("change_percent_24h")
-            if change_percent and "%" in str(change_percent):
-                try:
-                    percent = float(change_percent.replace("%", ""))
-                    if percent < -5:
-                        risk_score = max(risk_score, 9)
-                        summary += " Market shows significant downward movement."
-                    elif percent < -2:
-                        risk_score = max(risk_score, 6)
-                        summary += " Market shows moderate decline."
-                except ValueError:
-                    pass
-        return {"company": company_name, "risk_score": risk_score, "summary": summary}
+    def assess_risk_many(self, companies: list) -> list:
+        """
+        Rule-based risk reports for many companies in one vectorised pass.
+        """
+        return self.risk_engine.score_many(companies)
  
     def analyze_company_condition(self, company_data: dict) -> dict:
+        key = content_key("company_condition", self.model_name, company_data)
+        return self.cache.get_or_load(key, lambda: self._analyze_company_condition(company_data), cache_if=_is_success)
+ 
+    def _analyze_company_condition(self, company_data: dict) -> dict:
         try:
             prompt = f"""
             You are a financial risk AI. Analyze the following company information and
@@ -57,19 +56,17 @@ class CROAgent:
             Company data:
             {json.dumps(company_data, indent=2)}
             """
-            response = self.model.generate_content(prompt)
-            text = response.text
-            start_index = text.find("{")
-            end_index = text.rfind("}")
-            if start_index != -1 and end_index != -1:
-                json_str = text[start_index:end_index+1]
-                return json.loads(json_str)
-            else:
-                return {"error": "Could not parse Gemini response."}
+            return generate_structured(self.model, prompt, CompanyCondition).model_dump()
+        except StructuredOutputError:
+            return {"error": "Could not parse Gemini response."}
         except Exception as e:
             return {"error": f"Gemini API error: {e}"}
  
     def simulate_scenario(self, company_name: str, scenario: str) -> dict:
+        key = content_key("simulate_scenario", self.model_name, company_name, scenario.strip())
+        return self.cache.get_or_load(key, lambda: self._simulate_scenario(company_name, scenario), cache_if=_is_success)
+ 
+    def _simulate_scenario(self, company_name: str, scenario: str) -> dict:
         try:
             prompt = f"""
             You are a financial risk AI. A scenario is being simulated for {company_name}:
@@ -79,14 +76,8 @@ class CROAgent:
             Using current market trends and historical data, provide a JSON object with:
             predicted_risk_score (1-10), potential_impact, and suggested_actions.
             """
-            response = self.model.generate_content(prompt)
-            text = response.text
-            start_index = text.find("{")
-            end_index = text.rfind("}")
-            if start_index != -1 and end_index != -1:
-                json_str = text[start_index:end_index+1]
-                return json.loads(json_str)
-            else:
-                return {"error": "Could not parse Gemini response for scenario."}
+            return generate_structured(self.model, prompt, ScenarioSimulation).model_dump()
+        except StructuredOutputError:
+            return {"error": "Could not parse Gemini response for scenario."}
         except Exception as e:
             return {"error": f"Gemini API error: {e}"}
\ No newline at end of file
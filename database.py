@@ -1,58 +1,534 @@
 # database.py
-from neo4j import GraphDatabase
+import logging
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Same values as neo4j.READ_ACCESS / neo4j.WRITE_ACCESS; the driver package itself
+# is only imported when the first session is opened
+READ_ACCESS = "READ"
+WRITE_ACCESS = "WRITE"
+
+# Every write transaction bumps a single graph version and stamps what it creates
+# with it. Readers can then ask for everything newer than a version they have seen.
+NEXT_VERSION_QUERY = """
+MERGE (meta:GraphMeta {key: 'graph'})
+SET meta.version = coalesce(meta.version, 0) + 1
+RETURN meta.version AS version
+"""
+
+CURRENT_VERSION_QUERY = """
+OPTIONAL MATCH (meta:GraphMeta {key: 'graph'})
+RETURN coalesce(meta.version, 0) AS version
+"""
+
+CREATE_NODE_QUERY = """
+MERGE (i:Institution {name: $name})
+ON CREATE SET i.version = $version
+RETURN i
+"""
+
+CREATE_EDGE_QUERY = """
+MATCH (a:Institution {name: $source_name})
+MATCH (b:Institution {name: $target_name})
+MERGE (a)-[r:RELATIONSHIP {type: $relationship_type}]->(b)
+ON CREATE SET r.version = $version
+"""
+
+UPSERT_NODES_QUERY = """
+UNWIND $names AS name
+MERGE (i:Institution {name: name})
+ON CREATE SET i.version = $version
+"""
+
+UPSERT_EDGES_QUERY = """
+UNWIND $edges AS edge
+MERGE (a:Institution {name: edge.source})
+ON CREATE SET a.version = $version
+MERGE (b:Institution {name: edge.target})
+ON CREATE SET b.version = $version
+MERGE (a)-[r:RELATIONSHIP {type: edge.type}]->(b)
+ON CREATE SET r.version = $version
+"""
+
+GRAPH_NODES_QUERY = """
+MATCH (n:Institution)
+RETURN id(n) AS id, n.name AS label
+"""
+
+GRAPH_EDGES_QUERY = """
+MATCH (a:Institution)-[r:RELATIONSHIP]->(b:Institution)
+RETURN id(r) AS id, id(a) AS from, id(b) AS to, r.type AS label
+"""
+
+GRAPH_NODES_SINCE_QUERY = """
+MATCH (n:Institution)
+WHERE n.version > $since
+RETURN id(n) AS id, n.name AS label
+"""
+
+GRAPH_EDGES_SINCE_QUERY = """
+MATCH (a:Institution)-[r:RELATIONSHIP]->(b:Institution)
+WHERE r.version > $since
+RETURN id(r) AS id, id(a) AS from, id(b) AS to, r.type AS label
+"""
+
+NEIGHBORHOOD_CENTER_QUERY = """
+MATCH (c:Institution {name: $name})
+RETURN id(c) AS id, c.name AS label
+"""
+
+# Only edges not already collected, each once (an edge between two frontier nodes
+# matches from both ends), so known edges never use up the LIMIT.
+NEIGHBORHOOD_HOP_QUERY = """
+MATCH (a:Institution)-[r:RELATIONSHIP]-(:Institution)
+WHERE id(a) IN $ids AND NOT id(r) IN $seen
+WITH DISTINCT r
+WITH r, CASE WHEN id(startNode(r)) IN $ids THEN endNode(r) ELSE startNode(r) END AS b
+RETURN id(r) AS id, id(startNode(r)) AS from, id(endNode(r)) AS to, r.type AS label,
+       id(b) AS neighbor_id, b.name AS neighbor_label
+LIMIT $limit
+"""
+
+# Keyset pagination over the Institution.name index: each page starts after the
+# last name of the previous one, so deep pages cost the same as the first.
+EXPORT_NODES_QUERY = """
+MATCH (n:Institution)
+WHERE n.name > $after
+RETURN id(n) AS id, n.name AS label
+ORDER BY n.name
+LIMIT $limit
+"""
+
+EXPORT_EDGES_QUERY = """
+MATCH (a:Institution)-[r:RELATIONSHIP]->(b:Institution)
+WHERE id(a) IN $ids
+RETURN id(r) AS id, id(a) AS from, id(b) AS to, r.type AS label
+"""
+
+# Schema objects the graph relies on, as (name, statement) pairs. The uniqueness
+# constraint turns every MERGE on Institution.name into an index seek and stops
+# concurrent writers from creating duplicate institutions.
+SCHEMA_MIGRATIONS = [
+    ("institution_name",
+     "CREATE CONSTRAINT institution_name IF NOT EXISTS FOR (i:Institution) REQUIRE i.name IS UNIQUE"),
+    ("graph_meta_key",
+     "CREATE CONSTRAINT graph_meta_key IF NOT EXISTS FOR (m:GraphMeta) REQUIRE m.key IS UNIQUE"),
+    ("relationship_type",
+     "CREATE INDEX relationship_type IF NOT EXISTS FOR ()-[r:RELATIONSHIP]-() ON (r.type)"),
+    ("institution_version",
+     "CREATE INDEX institution_version IF NOT EXISTS FOR (i:Institution) ON (i.version)"),
+    ("relationship_version",
+     "CREATE INDEX relationship_version IF NOT EXISTS FOR ()-[r:RELATIONSHIP]-() ON (r.version)"),
+]
+
+SHOW_SCHEMA_QUERIES = [
+    "SHOW CONSTRAINTS YIELD name RETURN name",
+    "SHOW INDEXES YIELD name RETURN name",
+]
+
+
+class DatabaseBusyError(RuntimeError):
+    """
+    Raised when no database slot frees up within the acquisition timeout.
+    """
+
 
 class DatabaseManager:
     """
     Manages the connection and all interactions with the Neo4j database.
+
+    Reads and writes go through separate entry points (read/write for single
+    queries, read_work/write_work for transaction functions) so that reads can be
+    routed to followers/read replicas while writes go to the leader. Both use the
+    driver's managed transactions, which retry transient failures.
+
+    The driver is created on first use (or by connect()), so constructing a
+    manager neither imports neo4j nor touches the network.
     """
-    def __init__(self, uri, user, password):
-        # Establishes the connection to your running Neo4j instance
-        self._driver = GraphDatabase.driver(uri, auth=(user, password))
-        print("Database connection established.")
+    def __init__(self, uri, user, password, database=None,
+                 max_connection_pool_size: int = 50,
+                 connection_acquisition_timeout: float = 30.0,
+                 max_concurrency: int = None):
+        self._uri = uri
+        self._auth = (user, password)
+        self._max_connection_pool_size = max_connection_pool_size
+        self._driver_instance = None
+        self._driver_lock = threading.Lock()
+        self._database = database
+        self._acquisition_timeout = connection_acquisition_timeout
+        # Optional cap on sessions in flight. Callers beyond the cap wait here with a
+        # timeout instead of piling up inside the driver's connection pool.
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        # Callbacks run after every successful graph write (e.g. cache invalidation)
+        self._write_listeners = []
+
+    @classmethod
+    def from_settings(cls, settings, **kwargs):
+        """
+        A manager for the Neo4j instance named in config.Settings.
+        """
+        return cls(settings.neo4j_uri, settings.neo4j_user, settings.neo4j_password,
+                   database=settings.neo4j_database, **kwargs)
+
+    @property
+    def _driver(self):
+        if self._driver_instance is None:
+            with self._driver_lock:
+                if self._driver_instance is None:
+                    from neo4j import GraphDatabase
+
+                    self._driver_instance = GraphDatabase.driver(
+                        self._uri,
+                        auth=self._auth,
+                        max_connection_pool_size=self._max_connection_pool_size,
+                        connection_acquisition_timeout=self._acquisition_timeout,
+                    )
+        return self._driver_instance
+
+    def connect(self):
+        """
+        Creates the driver and checks that Neo4j is reachable, so the first
+        request doesn't pay for the handshake.
+        """
+        self._driver.verify_connectivity()
+        logger.info("Database connection established.")
 
     def close(self):
         # Closes the connection when the application shuts down
-        self._driver.close()
+        with self._driver_lock:
+            driver, self._driver_instance = self._driver_instance, None
+        if driver is not None:
+            driver.close()
+
+    @contextmanager
+    def _session(self, access_mode):
+        if self._slots is not None and not self._slots.acquire(timeout=self._acquisition_timeout):
+            raise DatabaseBusyError(
+                f"No database slot available after {self._acquisition_timeout}s."
+            )
+        try:
+            with self._driver.session(database=self._database, default_access_mode=access_mode) as session:
+                yield session
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def add_write_listener(self, callback):
+        """
+        Registers a no-argument callback that runs after every graph write made
+        through this manager.
+        """
+        self._write_listeners.append(callback)
+
+    def _notify_write(self):
+        for callback in self._write_listeners:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning("Write listener failed: %s", e)
+
+    def read_work(self, work, *args, **kwargs):
+        """
+        Runs a transaction function in a managed read transaction.
+        """
+        with self._session(READ_ACCESS) as session, metrics.timed("neo4j", "read"):
+            return session.execute_read(work, *args, **kwargs)
+
+    def write_work(self, work, *args, **kwargs):
+        """
+        Runs a transaction function in a managed write transaction.
+        """
+        with self._session(WRITE_ACCESS) as session, metrics.timed("neo4j", "write"):
+            return session.execute_write(work, *args, **kwargs)
+
+    def read(self, query, parameters=None):
+        # Runs a read-only query and returns its records
+        return self.read_work(lambda tx: list(tx.run(query, parameters)))
+
+    def write(self, query, parameters=None):
+        # Runs a query that modifies the database and returns its records
+        return self.write_work(lambda tx: list(tx.run(query, parameters)))
 
     def execute_query(self, query, parameters=None):
-        # A helper function to run queries against the database
-        with self._driver.session() as session:
-            # Using write_transaction for queries that modify the database
-            result = session.write_transaction(lambda tx: list(tx.run(query, parameters)))
-            return result
+        # Kept for existing callers; everything through here is treated as a write
+        return self.write(query, parameters)
 
     def create_institution_node(self, name: str):
         """
         Creates a new :Institution node if it doesn't already exist.
         The MERGE command is crucial as it prevents creating duplicate companies.
         """
-        print(f"Database: Creating/merging node for {name}...")
-        query = "MERGE (i:Institution {name: $name}) RETURN i"
-        self.execute_query(query, {"name": name})
+        logger.debug("Creating/merging node for %s", name)
+        self.write_work(self._versioned_write, CREATE_NODE_QUERY, {"name": name})
+        self._notify_write()
 
     def create_relationship_edge(self, source_name: str, target_name: str, relationship_type: str):
         """
         Finds two existing institution nodes and creates a directed relationship between them.
         """
-        print(f"Database: Creating relationship: {source_name} -> {relationship_type} -> {target_name}")
-        query = """
-        MATCH (a:Institution {name: $source_name})
-        MATCH (b:Institution {name: $target_name})
-        MERGE (a)-[r:RELATIONSHIP {type: $relationship_type}]->(b)
-        """
-        self.execute_query(query, {
+        logger.debug("Creating relationship: %s -> %s -> %s", source_name, relationship_type, target_name)
+        self.write_work(self._versioned_write, CREATE_EDGE_QUERY, {
             "source_name": source_name,
             "target_name": target_name,
             "relationship_type": relationship_type
         })
+        self._notify_write()
+
+    @staticmethod
+    def _next_version(tx) -> int:
+        # Takes the write lock on the version node, so versions commit in order
+        return tx.run(NEXT_VERSION_QUERY).single()["version"]
+
+    @classmethod
+    def _versioned_write(cls, tx, query, parameters):
+        version = cls._next_version(tx)
+        return list(tx.run(query, {**parameters, "version": version}))
+
+    def ensure_schema(self) -> list:
+        """
+        Creates any missing constraints and indexes from SCHEMA_MIGRATIONS.
+        Idempotent, so it runs on every startup. Returns one entry per schema object
+        with a status of "exists", "created" or "failed" (e.g. the uniqueness
+        constraint can't be created while duplicate institutions are present).
+        """
+        existing = {record["name"] for query in SHOW_SCHEMA_QUERIES for record in self.read(query)}
+        report = []
+        for name, statement in SCHEMA_MIGRATIONS:
+            if name in existing:
+                report.append({"name": name, "status": "exists"})
+                continue
+            try:
+                self.write(statement)
+                report.append({"name": name, "status": "created"})
+            except Exception as e:
+                report.append({"name": name, "status": "failed", "error": str(e)})
+
+        applied = [entry["name"] for entry in report if entry["status"] == "created"]
+        failed = [entry["name"] for entry in report if entry["status"] == "failed"]
+        logger.info("Schema ready (created: %s, failed: %s).", applied or "none", failed or "none")
+        return report
+
+    def get_graph_version(self) -> int:
+        """
+        Returns the current graph version; it changes whenever the graph is written.
+        """
+        return self.read_work(lambda tx: tx.run(CURRENT_VERSION_QUERY).single()["version"])
+
+    def get_graph(self, since: int = None) -> dict:
+        """
+        Returns the institution graph as vis.js-ready nodes and edges plus a cursor.
+        With since=None the whole graph is returned. With a cursor from an earlier
+        call only nodes and edges created after that version are returned.
+        """
+        def _read(tx):
+            # Read the version first: anything committed afterwards is either in
+            # this response or picked up by the next delta, never lost.
+            version = tx.run(CURRENT_VERSION_QUERY).single()["version"]
+            full = since is None or since > version
+            if full:
+                nodes = [record.data() for record in tx.run(GRAPH_NODES_QUERY)]
+                edges = [record.data() for record in tx.run(GRAPH_EDGES_QUERY)]
+            else:
+                nodes = [record.data() for record in tx.run(GRAPH_NODES_SINCE_QUERY, since=since)]
+                edges = [record.data() for record in tx.run(GRAPH_EDGES_SINCE_QUERY, since=since)]
+            return {"nodes": nodes, "edges": edges, "cursor": version, "full": full}
+
+        return self.read_work(_read)
+
+    def encode_graph(self, make_writer, since: int = None):
+        """
+        Same contents as get_graph(), but the records are fed from the result cursors
+        straight into a writer from graphformat.py instead of being collected as
+        dicts. Returns writer.finish(cursor, full). make_writer() is called for each
+        transaction attempt, since managed transactions can be retried.
+        """
+        def _read(tx):
+            version = tx.run(CURRENT_VERSION_QUERY).single()["version"]
+            full = since is None or since > version
+            writer = make_writer()
+            if full:
+                writer.add_nodes(tx.run(GRAPH_NODES_QUERY))
+                writer.add_edges(tx.run(GRAPH_EDGES_QUERY))
+            else:
+                writer.add_nodes(tx.run(GRAPH_NODES_SINCE_QUERY, since=since))
+                writer.add_edges(tx.run(GRAPH_EDGES_SINCE_QUERY, since=since))
+            return writer.finish(version, full)
+
+        return self.read_work(_read)
+
+    def get_neighborhood(self, name: str, hops: int = 2, max_nodes: int = 200, max_edges: int = 500):
+        """
+        Returns the k-hop neighbourhood around one institution, expanded breadth-first
+        until either budget is spent. Returns None if the institution doesn't exist.
+        The result includes a graph cursor so callers can follow up with deltas.
+        """
+        def _read(tx):
+            version = tx.run(CURRENT_VERSION_QUERY).single()["version"]
+            center = tx.run(NEIGHBORHOOD_CENTER_QUERY, name=name).single()
+            if center is None:
+                return None
+
+            nodes = {center["id"]: center.data()}
+            edges = {}
+            frontier = [center["id"]]
+            truncated = False
+            for _ in range(hops):
+                if not frontier or truncated:
+                    break
+                next_frontier = []
+                # One extra row tells us whether the edge budget cut the hop short
+                limit = max_edges - len(edges) + 1
+                rows = 0
+                for record in tx.run(NEIGHBORHOOD_HOP_QUERY, ids=frontier, seen=list(edges), limit=limit):
+                    rows += 1
+                    if len(edges) >= max_edges:
+                        break
+                    neighbor_id = record["neighbor_id"]
+                    if neighbor_id not in nodes:
+                        if len(nodes) >= max_nodes:
+                            truncated = True
+                            continue
+                        nodes[neighbor_id] = {"id": neighbor_id, "label": record["neighbor_label"]}
+                        next_frontier.append(neighbor_id)
+                    edges[record["id"]] = {
+                        "id": record["id"],
+                        "from": record["from"],
+                        "to": record["to"],
+                        "label": record["label"],
+                    }
+                if rows >= limit:
+                    truncated = True
+                frontier = next_frontier
+
+            return {
+                "center": center["id"],
+                "nodes": list(nodes.values()),
+                "edges": list(edges.values()),
+                "truncated": truncated,
+                "cursor": version,
+            }
+
+        return self.read_work(_read)
+
+    def get_graph_page(self, after: str = "", limit: int = 500) -> dict:
+        """
+        Returns one page of the full graph export: up to `limit` institutions ordered
+        by name plus their outgoing relationships. `next_after` is the name to pass
+        as `after` for the following page, or None on the last page.
+        """
+        def _read(tx):
+            nodes = [record.data() for record in tx.run(EXPORT_NODES_QUERY, after=after, limit=limit)]
+            ids = [node["id"] for node in nodes]
+            edges = [record.data() for record in tx.run(EXPORT_EDGES_QUERY, ids=ids)] if ids else []
+            next_after = nodes[-1]["label"] if len(nodes) == limit else None
+            return {"nodes": nodes, "edges": edges, "next_after": next_after}
+
+        return self.read_work(_read)
+
+    @staticmethod
+    def _prepare_upsert(nodes, edges):
+        """
+        Normalises upsert_graph input. Returns (edge_rows, standalone, total_nodes):
+        deduplicated {"source", "target", "type"} rows, the names that don't appear
+        in any edge, and how many distinct institutions the upsert touches.
+        """
+        edge_rows = []
+        seen_edges = set()
+        for edge in edges:
+            if isinstance(edge, dict):
+                row = (edge.get("source"), edge.get("target"), edge.get("type"))
+            else:
+                row = tuple(edge)
+            if not all(row) or row in seen_edges:
+                continue
+            seen_edges.add(row)
+            edge_rows.append({"source": row[0], "target": row[1], "type": row[2]})
+
+        # Edge endpoints are merged by the edge statement itself, so only names
+        # that never appear in an edge need their own node statement.
+        edge_names = {name for row in edge_rows for name in (row["source"], row["target"])}
+        standalone = [name for name in dict.fromkeys(nodes) if name and name not in edge_names]
+        return edge_rows, standalone, len(edge_names) + len(standalone)
+
+    def upsert_graph(self, nodes, edges, batch_size: int = 500) -> dict:
+        """
+        Bulk version of create_institution_node/create_relationship_edge.
+        Every node and edge is sent through parameterised UNWIND statements, so one
+        analysis costs a single write transaction instead of one per node and edge.
+
+        nodes: iterable of institution names.
+        edges: iterable of (source_name, target_name, relationship_type) tuples or
+               dicts with "source", "target" and "type" keys.
+        batch_size: maximum rows per transaction; larger inputs are split into chunks.
+
+        Returns a dict with how many nodes and relationships were created or matched.
+        """
+        edge_rows, standalone, total_nodes = self._prepare_upsert(nodes, edges)
+
+        counts = {
+            "nodes_created": 0,
+            "nodes_matched": 0,
+            "relationships_created": 0,
+            "relationships_matched": 0,
+        }
+        if not total_nodes:
+            return counts
+
+        batch_size = max(1, int(batch_size))
+        node_batches = [standalone[i:i + batch_size] for i in range(0, len(standalone), batch_size)]
+        edge_batches = [edge_rows[i:i + batch_size] for i in range(0, len(edge_rows), batch_size)]
+        logger.debug("Upserting %d nodes and %d relationships", total_nodes, len(edge_rows))
+
+        def _write_batch(tx, name_batch, edge_batch):
+            # Returns the counters instead of mutating `counts`, so a retried
+            # transaction is not counted twice
+            version = self._next_version(tx)
+            nodes_created = relationships_created = 0
+            if name_batch:
+                summary = tx.run(UPSERT_NODES_QUERY, names=name_batch, version=version).consume()
+                nodes_created += summary.counters.nodes_created
+            if edge_batch:
+                summary = tx.run(UPSERT_EDGES_QUERY, edges=edge_batch, version=version).consume()
+                nodes_created += summary.counters.nodes_created
+                relationships_created += summary.counters.relationships_created
+            return nodes_created, relationships_created
+
+        # One transaction per batch; a typical analysis fits in a single one
+        with self._session(WRITE_ACCESS) as session:
+            for i in range(max(len(node_batches), len(edge_batches))):
+                with metrics.timed("neo4j", "upsert"):
+                    nodes_created, relationships_created = session.execute_write(
+                        _write_batch,
+                        node_batches[i] if i < len(node_batches) else [],
+                        edge_batches[i] if i < len(edge_batches) else [],
+                    )
+                counts["nodes_created"] += nodes_created
+                counts["relationships_created"] += relationships_created
+        self._notify_write()
+
+        counts["nodes_matched"] = total_nodes - counts["nodes_created"]
+        counts["relationships_matched"] = len(edge_rows) - counts["relationships_created"]
+        return counts
+
 
 # --- Independent Test Block ---
 # This allows you to test your database code without needing the other agents.
 if __name__ == '__main__':
-    # Connect to the database you started with Docker
-    db = DatabaseManager("bolt://localhost:7687", "neo4j", "password")
+    from config import get_settings
+
+    # Connect to the database you started with Docker (see NEO4J_* in config.py)
+    db = DatabaseManager.from_settings(get_settings())
 
     print("\n--- Running Database Test ---")
+
+    # Test 0: Make sure constraints and indexes are in place
+    print("\nStep 0: Bootstrapping schema...")
+    for entry in db.ensure_schema():
+        print(f"  {entry['name']}: {entry['status']}")
     
     # Test 1: Create some nodes
     print("\nStep 1: Creating nodes...")
@@ -67,6 +543,14 @@ if __name__ == '__main__':
         relationship_type="is a competitor to"
     )
 
+    # Test 3: Bulk-upsert a small graph in one transaction
+    print("\nStep 3: Bulk upserting nodes and relationships...")
+    counts = db.upsert_graph(
+        nodes=["JPMorgan Chase"],
+        edges=[("JPMorgan Chase", "Morgan Stanley", "is a competitor to")]
+    )
+    print(f"Upsert result: {counts}")
+
     print("\n--- Test Complete ---")
     print("Check your Neo4j browser at http://localhost:7474 to see the results!")
 
@@ -0,0 +1,131 @@
+# events.py
+import asyncio
+import logging
+
+import orjson
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PUBLISHED = REGISTRY.counter(
+    "events_published_total", "Server-sent events broadcast to subscribers.", ("event",)
+)
+SUBSCRIBERS_DROPPED = REGISTRY.counter(
+    "event_subscribers_dropped_total", "Subscribers disconnected because they fell too far behind."
+)
+
+
+def encode_event(event_id: int, event: str, data) -> bytes:
+    """
+    One event in the text/event-stream wire format.
+    """
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (event_id, event.encode(), orjson.dumps(data))
+
+
+class Subscriber:
+    """
+    One open event stream. Holds encoded events until the connection sends them.
+    `company` is the company the dashboard shows, which the publishers keep fresh.
+    """
+    def __init__(self, queue_size: int, company: str = None):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.company = company
+
+
+class EventBroker:
+    """
+    Fans events out to every open /api/events stream.
+
+    An event is encoded once and the same bytes are queued for every subscriber,
+    so publishing costs the same whether one tab or a hundred are open. A
+    subscriber whose queue fills up is disconnected rather than slowing the
+    others down; the browser's EventSource reconnects and the page resyncs.
+
+    publish() must be called from the event loop thread.
+    """
+    def __init__(self, queue_size: int = 256, heartbeat: float = 15.0):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscribers = set()
+        self._next_id = 0
+        # Created on first use so it binds to the server's running event loop
+        self._has_subscribers = None
+
+    def _bind(self):
+        if self._has_subscribers is None:
+            self._has_subscribers = asyncio.Event()
+
+    def subscribe(self, company: str = None) -> Subscriber:
+        self._bind()
+        subscriber = Subscriber(self.queue_size, company)
+        self._subscribers.add(subscriber)
+        self._has_subscribers.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+        if not self._subscribers:
+            self._has_subscribers.clear()
+
+    def idle(self) -> bool:
+        return not self._subscribers
+
+    def watched_companies(self) -> set:
+        return {subscriber.company for subscriber in self._subscribers if subscriber.company}
+
+    async def wait_for_subscribers(self):
+        self._bind()
+        await self._has_subscribers.wait()
+
+    def publish(self, event: str, data) -> int:
+        """
+        Queues the event for every subscriber and returns its id.
+        """
+        self._next_id += 1
+        message = encode_event(self._next_id, event, data)
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscriber)
+        EVENTS_PUBLISHED.inc(event)
+        return self._next_id
+
+    def _drop(self, subscriber: Subscriber):
+        # Replace the backlog with the end-of-stream marker
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+        self.unsubscribe(subscriber)
+        SUBSCRIBERS_DROPPED.inc()
+        logger.info("Dropped an event subscriber that fell %d events behind.", self.queue_size)
+
+    async def stream(self, company: str = None):
+        """
+        Subscribes and yields events as they arrive, with a comment line as a
+        heartbeat when idle so proxies keep the connection open. Unsubscribes
+        when the client goes away.
+        """
+        subscriber = self.subscribe(company)
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.unsubscribe(subscriber)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "watched_companies": sorted(self.watched_companies()),
+            "last_event_id": self._next_id,
+        }
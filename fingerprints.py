@@ -0,0 +1,115 @@
+# fingerprints.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def article_fingerprint(article: dict) -> str:
+    """
+    Hash of an article's title, source and content, ignoring case and surrounding whitespace.
+    """
+    parts = [str(article.get(field) or "").strip().lower() for field in ("title", "source", "content")]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class FingerprintStore:
+    """
+    Remembers, per company, which articles have already been analysed and the last
+    market snapshot, in a small sqlite file so it survives restarts.
+
+    The monitoring loop uses it to send only unseen articles to the analyst and to
+    skip the Gemini call and graph write entirely when nothing new arrived.
+    """
+    def __init__(self, path: str = ".cache/fingerprints.sqlite3", max_articles_per_company: int = 500,
+                 price_move_threshold: float = 0.5):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_articles_per_company = max_articles_per_company
+        # Percent move in current_price that counts as new market information
+        self.price_move_threshold = price_move_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS seen_articles ("
+            "company TEXT NOT NULL, fingerprint TEXT NOT NULL, seen_at REAL NOT NULL, "
+            "PRIMARY KEY (company, fingerprint));"
+            "CREATE TABLE IF NOT EXISTS market_snapshots ("
+            "company TEXT PRIMARY KEY, snapshot TEXT NOT NULL, updated_at REAL NOT NULL);"
+        )
+        self._conn.commit()
+
+    def new_articles(self, company: str, articles: list) -> list:
+        """
+        Returns the articles from `articles` that haven't been marked seen for this company.
+        """
+        if not articles:
+            return []
+        fingerprints = [article_fingerprint(article) for article in articles]
+        with self._lock:
+            placeholders = ",".join("?" * len(fingerprints))
+            rows = self._conn.execute(
+                f"SELECT fingerprint FROM seen_articles WHERE company = ? AND fingerprint IN ({placeholders})",
+                [company, *fingerprints],
+            ).fetchall()
+        seen = {row[0] for row in rows}
+        new, batch = [], set()
+        for article, fingerprint in zip(articles, fingerprints):
+            if fingerprint not in seen and fingerprint not in batch:
+                batch.add(fingerprint)
+                new.append(article)
+        return new
+
+    def market_changed(self, company: str, market_data: dict) -> bool:
+        """
+        True if the price moved more than `price_move_threshold` percent since the
+        last saved snapshot (or if there is no snapshot yet).
+        """
+        if not market_data:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT snapshot FROM market_snapshots WHERE company = ?", (company,)
+            ).fetchone()
+        if row is None:
+            return True
+        try:
+            last_price = float(json.loads(row[0]).get("current_price"))
+            price = float(market_data.get("current_price"))
+        except (TypeError, ValueError):
+            return True
+        if not last_price:
+            return price != last_price
+        return abs(price - last_price) / abs(last_price) * 100 >= self.price_move_threshold
+
+    def record(self, company: str, articles: list, market_data: dict = None):
+        """
+        Marks articles as seen and saves the market snapshot. Call this only after
+        the analysis succeeded, so a failed Gemini call doesn't lose the articles.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO seen_articles (company, fingerprint, seen_at) VALUES (?, ?, ?)",
+                [(company, article_fingerprint(article), now) for article in articles],
+            )
+            # Old headlines never come back from NewsAPI's latest-first query
+            self._conn.execute(
+                "DELETE FROM seen_articles WHERE company = ? AND fingerprint IN ("
+                "SELECT fingerprint FROM seen_articles WHERE company = ? "
+                "ORDER BY seen_at DESC LIMIT -1 OFFSET ?)",
+                (company, company, self.max_articles_per_company),
+            )
+            if market_data:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO market_snapshots (company, snapshot, updated_at) VALUES (?, ?, ?)",
+                    (company, json.dumps(market_data), now),
+                )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,164 @@
+# graphcache.py
+import re
+import threading
+import time
+
+from graphformat import WRITERS, compress
+
+# One entity-tag in an If-None-Match list: an optional weak prefix and a quoted opaque tag
+_ENTITY_TAG = re.compile(r'(?:W/)?("[^"]*")')
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header value matches `etag`, per RFC 9110: "*" or a
+    comma-separated list of tags, compared weakly (a W/ prefix is ignored).
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag[2:] if etag.startswith("W/") else etag
+    return etag in _ENTITY_TAG.findall(if_none_match)
+
+
+class GraphSnapshot:
+    """
+    One serialized copy of the graph in one format: the JSON body, its graph version
+    and an ETag. Compressed copies are made on first request and kept alongside.
+    """
+    def __init__(self, version: int, body: bytes, format: str = "json"):
+        self.version = version
+        self.body = body
+        self.format = format
+        self.etag = f'"graph-{version}"' if format == "json" else f'"graph-{version}-{format}"'
+        self._encoded = {"identity": body}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        """
+        The body compressed with `encoding` ("identity", "gzip" or "br"). Each
+        encoding is compressed once per snapshot, however many clients ask.
+        """
+        with self._lock:
+            data = self._encoded.get(encoding)
+            if data is None:
+                data = self._encoded[encoding] = compress(self.body, encoding)
+            return data
+
+    def etag_for(self, encoding: str) -> str:
+        # Compressed bytes are a different representation, so they get their own tag
+        return self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+
+
+class GraphSnapshotCache:
+    """
+    Keeps the full /api/graph_data payload as pre-encoded JSON bytes, one snapshot
+    per format, so that polling clients don't each rebuild it from Neo4j. A rebuild
+    streams the records into the format's writer (see graphformat.py) rather than
+    materialising the graph as dicts first.
+
+    The snapshots are dropped as soon as this process writes to the graph (via the
+    DatabaseManager write listener). Writes from other processes, such as the
+    vansh.py monitoring loop, are picked up by comparing the stored version against
+    the database's graph version at most once every `revalidate_interval` seconds.
+    """
+    def __init__(self, db_manager, revalidate_interval: float = 1.0):
+        self.db = db_manager
+        self.revalidate_interval = revalidate_interval
+        self._snapshots = {}  # format -> GraphSnapshot
+        self._validated_at = {}  # format -> time.monotonic() of the last version check
+        # Bumped on every invalidation so a rebuild that raced a write is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Serialises rebuilds so concurrent misses share a single Neo4j read
+        self._rebuild_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+        db_manager.add_write_listener(self.invalidate)
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshots.clear()
+            self._generation += 1
+            self.invalidations += 1
+
+    def _fresh_snapshot(self, format: str):
+        # Returns the cached snapshot if it is still current, otherwise None
+        with self._lock:
+            snapshot = self._snapshots.get(format)
+            if snapshot is None:
+                return None
+            if time.monotonic() - self._validated_at[format] < self.revalidate_interval:
+                return snapshot
+
+        if self.db.get_graph_version() != snapshot.version:
+            return None
+        with self._lock:
+            if self._snapshots.get(format) is snapshot:
+                self._validated_at[format] = time.monotonic()
+        return snapshot
+
+    def get(self, format: str = "json") -> GraphSnapshot:
+        """
+        Returns the current graph snapshot in `format` (see graphformat.FORMATS),
+        rebuilding it from Neo4j if needed.
+        """
+        snapshot = self._fresh_snapshot(format)
+        if snapshot is not None:
+            with self._lock:
+                self.hits += 1
+            return snapshot
+
+        with self._rebuild_lock:
+            # Another thread may have rebuilt it while we waited for the lock
+            with self._lock:
+                snapshot = self._snapshots.get(format)
+                if snapshot is not None and time.monotonic() - self._validated_at[format] < self.revalidate_interval:
+                    self.hits += 1
+                    return snapshot
+                generation = self._generation
+                self.misses += 1
+
+            encoded = self.db.encode_graph(WRITERS[format])
+            snapshot = GraphSnapshot(encoded.version, encoded.body(), format)
+            with self._lock:
+                if self._generation == generation:
+                    self._snapshots[format] = snapshot
+                    self._validated_at[format] = time.monotonic()
+            return snapshot
+
+    def cached_version(self):
+        """
+        The graph version of any snapshot validated within the last
+        `revalidate_interval` seconds, or None. Never touches Neo4j or rebuilds.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for format, snapshot in self._snapshots.items():
+                if now - self._validated_at[format] < self.revalidate_interval:
+                    return snapshot.version
+        return None
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = self._snapshots.get("json")
+            version = snapshot.version if snapshot is not None else None
+            formats = sorted(self._snapshots)
+            hits, misses, not_modified, invalidations = self.hits, self.misses, self.not_modified, self.invalidations
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "not_modified": not_modified,
+            "invalidations": invalidations,
+            "cached_version": version,
+            "cached_formats": formats,
+        }
@@ -0,0 +1,232 @@
+# graphformat.py
+import zlib
+
+import orjson
+
+# Values of /api/graph_data?format=
+FORMATS = ("json", "compact")
+
+# Bodies smaller than this are sent uncompressed; the headers would cost more than they save
+MIN_COMPRESS_SIZE = 1024
+
+_brotli = None
+
+
+def brotli_module():
+    """
+    The brotli module if it is installed, otherwise None (br is then never offered).
+    """
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+        except ImportError:
+            brotli = False
+        _brotli = brotli
+    return _brotli or None
+
+
+class EncodedGraph:
+    """
+    A graph response already encoded as JSON, kept as the chunks the writer produced.
+    """
+    def __init__(self, version: int, full: bool, chunks: list):
+        self.version = version
+        self.full = full
+        self.chunks = chunks
+        self.size = sum(len(chunk) for chunk in chunks)
+
+    def body(self) -> bytes:
+        return b"".join(self.chunks)
+
+
+class JsonGraphWriter:
+    """
+    Encodes graph records in the vis.js shape get_graph() returns
+    ({"nodes": [...], "edges": [...], "cursor", "full"}), `batch_size` records at a
+    time, so only one batch of dicts exists at once however large the graph is.
+    Nodes must be added before edges.
+    """
+    def __init__(self, batch_size: int = 4096):
+        self.batch_size = batch_size
+        self.chunks = []
+        self._section = None
+        self._empty = True
+
+    def _open(self, section: bytes):
+        self.chunks.append((b'{"' if self._section is None else b'],"') + section + b'":[')
+        self._section = section
+        self._empty = True
+
+    def _write(self, rows: list):
+        if rows:
+            encoded = orjson.dumps(rows)[1:-1]
+            self.chunks.append(encoded if self._empty else b"," + encoded)
+            self._empty = False
+
+    def add_nodes(self, records):
+        self._open(b"nodes")
+        batch = []
+        for record in records:
+            batch.append({"id": record["id"], "label": record["label"]})
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def add_edges(self, records):
+        if self._section is None:
+            self.add_nodes(())
+        self._open(b"edges")
+        batch = []
+        for record in records:
+            batch.append({"id": record["id"], "from": record["from"], "to": record["to"], "label": record["label"]})
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        self._write(batch)
+
+    def finish(self, version: int, full: bool) -> EncodedGraph:
+        if self._section != b"edges":
+            self.add_edges(())
+        self.chunks.append(b'],"cursor":%d,"full":%s}' % (version, b"true" if full else b"false"))
+        return EncodedGraph(version, full, self.chunks)
+
+
+class CompactGraphWriter:
+    """
+    Encodes graph records column by column, for clients that don't need vis.js
+    objects:
+
+        {"format": "compact", "cursor", "full",
+         "nodes": {"id": [...], "label": [...]},
+         "refs": [...],
+         "edges": {"id": [...], "from": [...], "to": [...], "label": [...]},
+         "edge_labels": [...]}
+
+    Edge endpoints are indexes into nodes.id followed by refs (the ids of endpoints
+    a delta doesn't include as nodes; always empty for the full graph), and edge
+    labels are indexes into edge_labels, so each relationship type is sent once.
+    Nodes must be added before edges.
+    """
+    def __init__(self):
+        # Raw columns; endpoints and labels are mapped to indexes in finish()
+        self.node_ids = []
+        self.node_labels = []
+        self.edge_ids = []
+        self.edge_from = []
+        self.edge_to = []
+        self.edge_labels = []
+
+    def add_nodes(self, records):
+        ids, labels = self.node_ids.append, self.node_labels.append
+        for record in records:
+            ids(record["id"])
+            labels(record["label"])
+
+    def add_edges(self, records):
+        ids, sources, targets, labels = (
+            self.edge_ids.append, self.edge_from.append, self.edge_to.append, self.edge_labels.append
+        )
+        for record in records:
+            ids(record["id"])
+            sources(record["from"])
+            targets(record["to"])
+            labels(record["label"])
+
+    def finish(self, version: int, full: bool) -> EncodedGraph:
+        index = dict(zip(self.node_ids, range(len(self.node_ids))))
+        refs = []
+
+        def positions(endpoints):
+            found = list(map(index.get, endpoints))
+            if None in found:
+                # Only in deltas: the edge touches a node this response doesn't include
+                for i, position in enumerate(found):
+                    if position is None:
+                        node_id = endpoints[i]
+                        position = index.get(node_id)
+                        if position is None:
+                            position = index[node_id] = len(self.node_ids) + len(refs)
+                            refs.append(node_id)
+                        found[i] = position
+            return found
+
+        edge_from, edge_to = positions(self.edge_from), positions(self.edge_to)
+        label_index = {label: position for position, label in enumerate(dict.fromkeys(self.edge_labels))}
+        body = orjson.dumps({
+            "format": "compact",
+            "cursor": version,
+            "full": full,
+            "nodes": {"id": self.node_ids, "label": self.node_labels},
+            "refs": refs,
+            "edges": {
+                "id": self.edge_ids,
+                "from": edge_from,
+                "to": edge_to,
+                "label": list(map(label_index.__getitem__, self.edge_labels)),
+            },
+            "edge_labels": list(label_index),
+        })
+        return EncodedGraph(version, full, [body])
+
+
+WRITERS = {"json": JsonGraphWriter, "compact": CompactGraphWriter}
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """
+    Picks "br", "gzip" or "identity" from an Accept-Encoding header, honouring
+    q-values and preferring br on a tie. br is only offered if brotli is installed.
+    """
+    offered = ["br", "gzip"] if brotli_module() is not None else ["gzip"]
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding == "*":
+            for name in offered:
+                weights.setdefault(name, q)
+        elif coding in offered:
+            weights[coding] = q
+    best = max(offered, key=lambda name: weights.get(name, 0.0))
+    return best if weights.get(best, 0.0) > 0 else "identity"
+
+
+def _compressor(encoding: str):
+    if encoding == "gzip":
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        return compressor.compress, compressor.flush
+    if encoding == "br":
+        compressor = brotli_module().Compressor(quality=5)
+        return compressor.process, compressor.finish
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "identity":
+        return data
+    process, finish = _compressor(encoding)
+    return process(data) + finish()
+
+
+def compress_chunks(chunks, encoding: str):
+    """
+    Yields `chunks` compressed as one stream, for chunked responses.
+    """
+    if encoding == "identity":
+        yield from chunks
+        return
+    process, finish = _compressor(encoding)
+    for chunk in chunks:
+        compressed = process(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
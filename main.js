@@ -3,67 +3,120 @@ const DEFAULT_COMPANY = "Microsoft";
 let currentCompany = DEFAULT_COMPANY;
  
 // --- Draw Graph ---
+// The network is built once and shows the neighbourhood of `currentCompany`
+// (or the whole graph if that company isn't in it yet). After that, "graph" events
+// from /api/events carry what changed since `graphCursor` and patch the DataSets in place.
+const graphNodes = new vis.DataSet();
+const graphEdges = new vis.DataSet();
+let graphNetwork = null;
+let graphCursor = null;
+let graphScope = null;
+ 
+function replaceDataSet(dataSet, items) {
+  const keep = new Set(items.map(item => item.id));
+  dataSet.remove(dataSet.getIds().filter(id => !keep.has(id)));
+  dataSet.update(items);
+}
+ 
+async function loadGraphView() {
+  let response = await fetch(`http://localhost:8000/api/graph/neighborhood/${encodeURIComponent(currentCompany)}`);
+  graphScope = currentCompany;
+  if (response.status === 404) {
+    response = await fetch('http://localhost:8000/api/graph_data');
+    graphScope = null;
+  }
+  const data = await response.json();
+  replaceDataSet(graphNodes, data.nodes);
+  replaceDataSet(graphEdges, data.edges);
+  graphCursor = data.cursor;
+}
+ 
+async function applyGraphDelta(delta) {
+  try {
+    if (graphCursor === null || delta.cursor <= graphCursor) {
+      return;
+    }
+    if (delta.full || delta.since > graphCursor) {
+      // Missed part of the history: load the view again
+      await loadGraphView();
+    } else if (graphScope === null) {
+      graphNodes.update(delta.nodes);
+      graphEdges.update(delta.edges);
+      graphCursor = delta.cursor;
+    } else if (delta.edges.some(edge => graphNodes.get(edge.from) || graphNodes.get(edge.to))) {
+      // Something changed next to what we're showing: re-fetch the neighbourhood
+      await loadGraphView();
+    } else {
+      graphCursor = delta.cursor;
+    }
+  } catch (error) {
+    console.error("Failed to apply graph update:", error);
+  }
+}
+ 
 async function drawGraph() {
   try {
-    const response = await fetch('http://localhost:8000/api/graph_data');
-    const data = await response.json();
-    const container = document.getElementById('mynetwork');
- 
-    const graphData = {
-      nodes: new vis.DataSet(data.nodes),
-      edges: new vis.DataSet(data.edges),
-    };
- 
-    const options = {
-      nodes: { shape: 'dot', size: 18, font: { size: 14, color: '#ffffff' }, borderWidth: 2 },
-      edges: { width: 2, color: { inherit: 'from' }, arrows: { to: { enabled: true, scaleFactor: 0.8 } }, font: { color: '#ffffff', align: 'top' } },
-      physics: { enabled: true, solver: 'barnesHut', barnesHut: { gravitationalConstant: -3000 } },
-    };
-    new vis.Network(container, graphData, options);
+    await loadGraphView();
+ 
+    if (graphNetwork === null) {
+      const container = document.getElementById('mynetwork');
+      const options = {
+        nodes: { shape: 'dot', size: 18, font: { size: 14, color: '#ffffff' }, borderWidth: 2 },
+        edges: { width: 2, color: { inherit: 'from' }, arrows: { to: { enabled: true, scaleFactor: 0.8 } }, font: { color: '#ffffff', align: 'top' } },
+        physics: { enabled: true, solver: 'barnesHut', barnesHut: { gravitationalConstant: -3000 } },
+      };
+      graphNetwork = new vis.Network(container, { nodes: graphNodes, edges: graphEdges }, options);
+    }
   } catch (error) {
     console.error("Failed to draw graph:", error);
   }
 }
  
 // --- Fetch Risk Alerts ---
+function showRiskAlerts(data) {
+  document.getElementById("risk-alerts").value = JSON.stringify(data.risk_report, null, 2);
+}
+ 
 async function fetchRiskAlerts() {
   try {
     const response = await fetch(`http://localhost:8000/api/risk_alerts/${currentCompany}`);
-    const data = await response.json();
-    document.getElementById("risk-alerts").value = JSON.stringify(data.risk_report, null, 2);
+    showRiskAlerts(await response.json());
   } catch (error) {
     console.error("Failed to fetch CRO alerts:", error);
   }
 }
  
 // --- Fetch Company Condition ---
+function showCompanyCondition(data) {
+  document.getElementById("company-name").innerText = data.company;
+  const newsElem = document.getElementById("company-news");
+  newsElem.innerHTML = "";
+  if (Array.isArray(data.news)) {
+    data.news.forEach(article => {
+      const div = document.createElement("div");
+      div.innerHTML = `<b>${article.title}</b> - ${article.source}<br>${article.content || ""}<hr>`;
+      newsElem.appendChild(div);
+    });
+  } else {
+    newsElem.innerText = "No news available.";
+  }
+ 
+  const marketElem = document.getElementById("company-market");
+  const md = data.market_data || {};
+  marketElem.innerHTML = `
+    Current Price: $${md.current_price || "N/A"} <br>
+    Change (24h): $${md.price_change_24h || "N/A"} (${md.change_percent_24h != null ? `${md.change_percent_24h}%` : "N/A"})
+  `;
+ 
+  document.getElementById("company-report").innerText = data.report ? JSON.stringify(data.report, null, 2) : "No report available.";
+}
+ 
 async function fetchCompanyCondition(company) {
   try {
     const response = await fetch(`http://localhost:8000/api/company_condition/${company}`);
     const data = await response.json();
     currentCompany = company;
- 
-    document.getElementById("company-name").innerText = data.company;
-    const newsElem = document.getElementById("company-news");
-    newsElem.innerHTML = "";
-    if (Array.isArray(data.news)) {
-      data.news.forEach(article => {
-        const div = document.createElement("div");
-        div.innerHTML = `<b>${article.title}</b> - ${article.source}<br>${article.content || ""}<hr>`;
-        newsElem.appendChild(div);
-      });
-    } else {
-      newsElem.innerText = "No news available.";
-    }
- 
-    const marketElem = document.getElementById("company-market");
-    const md = data.market_data || {};
-    marketElem.innerHTML = `
-      Current Price: $${md.current_price || "N/A"} <br>
-      Change (24h): $${md.price_change_24h || "N/A"} (${md.change_percent_24h || "N/A"})
-    `;
- 
-    document.getElementById("company-report").innerText = data.report ? JSON.stringify(data.report, null, 2) : "No report available.";
+    showCompanyCondition(data);
   } catch (error) {
     console.error(`Failed to fetch condition for ${company}:`, error);
   }
@@ -88,13 +141,32 @@ async function runSimulation() {
   }
 }
  
-// --- INITIALIZATION ---
-document.addEventListener("DOMContentLoaded", () => {
+// --- Live Updates ---
+// One server-sent event stream replaces the polling timers. The server pushes graph
+// deltas and, when the current company's data changes, new risk and condition
+// reports. Each (re)connect resyncs through the REST endpoints, since events sent
+// while disconnected are not replayed.
+function subscribeToUpdates() {
+  const events = new EventSource(`http://localhost:8000/api/events?company=${encodeURIComponent(currentCompany)}`);
+  events.addEventListener("open", () => {
     drawGraph();
     fetchRiskAlerts();
-    fetchCompanyCondition(DEFAULT_COMPANY);
+    fetchCompanyCondition(currentCompany);
+  });
+  events.addEventListener("graph", event => applyGraphDelta(JSON.parse(event.data)));
+  events.addEventListener("risk", event => {
+    const data = JSON.parse(event.data);
+    if (data.company === currentCompany) showRiskAlerts(data);
+  });
+  events.addEventListener("condition", event => {
+    const data = JSON.parse(event.data);
+    if (data.company === currentCompany) showCompanyCondition(data);
+  });
+  events.addEventListener("error", () => console.warn("Live updates disconnected, reconnecting..."));
+  return events;
+}
  
-    setInterval(drawGraph, 15000);
-    setInterval(fetchRiskAlerts, 60000);
-    setInterval(() => fetchCompanyCondition(currentCompany), 15000);
+// --- INITIALIZATION ---
+document.addEventListener("DOMContentLoaded", () => {
+    subscribeToUpdates();
 });
\ No newline at end of file
@@ -0,0 +1,211 @@
+# metrics.py
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers a sub-millisecond cache read up to a slow Gemini answer
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def configure_logging(level: str = None):
+    """
+    Sets up root logging for an entry point (api.py, vansh.py). The level comes
+    from `level` or the LOG_LEVEL environment variable (default INFO); use
+    WARNING to silence the per-call messages.
+    """
+    logging.basicConfig(level=(level or os.getenv("LOG_LEVEL", "INFO")).upper(), format=LOG_FORMAT)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic count per label combination, e.g. errors per upstream.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label combination, in the Prometheus layout.
+    observe() is a bisect and a few additions under a lock.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [per-bucket counts (+Inf last), sum, count]
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, *labels) -> dict:
+        """
+        {"count", "sum"} for one label combination (zeros if never observed).
+        """
+        with self._lock:
+            series = self._series.get(labels)
+            return {"count": series[2], "sum": series[1]} if series else {"count": 0, "sum": 0.0}
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_label_text(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_label_text(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_label_text(self.labelnames, labels)} {count}"
+
+
+class CallbackGauge:
+    """
+    Gauge read at scrape time from fn(), which returns {label values tuple: value}.
+    Used to expose counters that other objects already keep (caches, upstream pools).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def samples(self):
+        for labels, value in sorted(self.fn().items()):
+            if value is not None:
+                yield f"{self.name}{_label_text(self.labelnames, labels)} {_number(value)}"
+
+
+class Registry:
+    """
+    Holds metrics and renders them in the Prometheus text exposition format.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_callback(self, name: str, help: str, fn, labelnames=()) -> CallbackGauge:
+        # Replaces an earlier callback of the same name (e.g. when the app is rebuilt)
+        gauge = CallbackGauge(name, help, fn, labelnames)
+        with self._lock:
+            self._metrics[name] = gauge
+        return gauge
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "upstream_call_seconds", "Latency of calls to NewsAPI, yfinance, Gemini and Neo4j.", ("upstream", "operation")
+)
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "upstream_errors_total", "Upstream calls that raised.", ("upstream", "operation")
+)
+UPSTREAM_BYTES = REGISTRY.histogram(
+    "upstream_payload_bytes", "Size of requests sent to and responses received from upstreams.",
+    ("upstream", "direction"), buckets=SIZE_BUCKETS,
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Gemini tokens as reported in usage metadata.", ("kind",)
+)
+PARSE_SECONDS = REGISTRY.histogram(
+    "json_parse_seconds", "Time spent parsing and validating model JSON.", ("schema",)
+)
+PARSE_ERRORS = REGISTRY.counter(
+    "json_parse_errors_total", "Model responses that failed to parse or validate.", ("schema",)
+)
+
+
+@contextmanager
+def timed(upstream: str, operation: str):
+    """
+    Records the block's duration in upstream_call_seconds, and counts it in
+    upstream_errors_total if it raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(upstream, operation)
+        raise
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream, operation)
@@ -0,0 +1,148 @@
+# pipeline.py
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Placed on a stage's queue to tell one of its workers to exit
+_STOP = object()
+
+
+class Stage:
+    """
+    One step of a Pipeline, run by `concurrency` worker threads.
+
+    `fn(item)` returns the item to hand to the next stage, or None to drop it. If
+    batch_size is set the stage collects up to batch_size items (waiting at most
+    batch_timeout seconds for a batch to fill) and calls `fn(items)` once, which
+    returns a list of results (or None). Each stage reads from its own bounded
+    queue, so a slow stage blocks the one before it instead of buffering forever.
+    """
+    def __init__(self, name: str, fn, concurrency: int = 1, queue_size: int = 100,
+                 batch_size: int = None, batch_timeout: float = 1.0):
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def _next_batch(self):
+        # Returns (items, stop_seen)
+        item = self.queue.get()
+        if item is _STOP:
+            return [], True
+        items = [item]
+        deadline = time.monotonic() + self.batch_timeout
+        while len(items) < (self.batch_size or 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _process(self, items):
+        started = time.monotonic()
+        try:
+            if self.batch_size is not None:
+                results = self.fn(items) or []
+            else:
+                result = self.fn(items[0])
+                results = [] if result is None else [result]
+        except Exception as e:
+            logger.error("Stage %s failed on %d item(s): %s", self.name, len(items), e)
+            results = []
+            with self._lock:
+                self.errors += len(items)
+        with self._lock:
+            self.batches += 1
+            self.processed += len(items)
+            self.busy_seconds += time.monotonic() - started
+        return results
+
+    def stats(self, elapsed: float) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+                "concurrency": self.concurrency,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "batches": self.batches,
+                "throughput_per_sec": round(self.processed / elapsed, 3) if elapsed > 0 else 0.0,
+                "avg_batch_seconds": round(self.busy_seconds / self.batches, 4) if self.batches else 0.0,
+            }
+
+
+class Pipeline:
+    """
+    Chains Stages with bounded queues, e.g. scout -> analyst -> graph store, so
+    slow Gemini calls overlap with fetching and graph writes can be batched.
+    """
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._threads = []
+        self._started_at = None
+
+    def start(self):
+        self._started_at = time.monotonic()
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for n in range(stage.concurrency):
+                thread = threading.Thread(
+                    target=self._worker, args=(stage, downstream),
+                    name=f"pipeline-{stage.name}-{n}", daemon=True,
+                )
+                thread.start()
+                self._threads.append((stage, thread))
+
+    def _worker(self, stage, downstream):
+        while True:
+            items, stop = stage._next_batch()
+            if items:
+                results = stage._process(items)
+                if downstream is not None:
+                    with stage._lock:
+                        stage.dropped += max(0, len(items) - len(results))
+                    for result in results:
+                        # Blocks when the next stage is full: that's the backpressure
+                        downstream.queue.put(result)
+            if stop:
+                return
+
+    def submit(self, item, timeout: float = None):
+        """
+        Adds an item to the first stage. Blocks while that stage's queue is full
+        (raises queue.Full after `timeout` seconds if one is given).
+        """
+        self.stages[0].queue.put(item, timeout=timeout)
+
+    def stop(self):
+        """
+        Lets every stage finish what is already queued, then stops the workers.
+        """
+        for stage in self.stages:
+            for _ in range(stage.concurrency):
+                stage.queue.put(_STOP)
+            for owner, thread in self._threads:
+                if owner is stage:
+                    thread.join()
+
+    def stats(self) -> dict:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        return {stage.name: stage.stats(elapsed) for stage in self.stages}
@@ -0,0 +1,139 @@
+# quotes.py
+import threading
+import time
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+# pandas is imported inside the functions that build frames: it is slow to import
+# and only needed once quotes are actually fetched
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Numeric columns of a quote frame (one row per ticker)
+QUOTE_COLUMNS = ["current_price", "price_change_24h", "change_percent_24h", "as_of"]
+
+
+def bars_by_ticker(frame: "pd.DataFrame", tickers: list) -> dict:
+    """
+    Splits a yf.download() result into {ticker: (timestamps, opens, closes)} NumPy
+    arrays, dropping empty bars. Handles both the (field, ticker) column layout and
+    the flat one older yfinance versions return for a single ticker.
+    """
+    import pandas as pd
+
+    if frame is None or frame.empty:
+        return {}
+    timestamps = frame.index.to_numpy(dtype="datetime64[s]").astype(np.int64)
+    bars = {}
+    for ticker in tickers:
+        if isinstance(frame.columns, pd.MultiIndex):
+            if ticker not in frame.columns.get_level_values(-1):
+                continue
+            opens = frame[("Open", ticker)].to_numpy(dtype=np.float64)
+            closes = frame[("Close", ticker)].to_numpy(dtype=np.float64)
+        elif len(tickers) == 1:
+            opens = frame["Open"].to_numpy(dtype=np.float64)
+            closes = frame["Close"].to_numpy(dtype=np.float64)
+        else:
+            continue
+        valid = ~(np.isnan(opens) | np.isnan(closes))
+        if valid.any():
+            bars[ticker] = (timestamps[valid], opens[valid], closes[valid])
+    return bars
+
+
+class IntradayHistory:
+    """
+    Keeps the last `window` seconds of intraday bars per ticker in NumPy arrays.
+
+    Bulk quote fetches append only bars newer than the ones already held, and a
+    quote that was refreshed less than `max_age` seconds ago is served from the
+    buffer without going back to yfinance.
+
+    The "24h" change is measured as before, from the open of the latest trading
+    session to the latest close. A session starts after a gap of more than
+    `session_gap` seconds between bars, so the result does not depend on how long
+    the process has been buffering. A market that never closes has no such gap and
+    is measured from the oldest bar in the window.
+    """
+    def __init__(self, window: float = 86400, max_bars: int = 2048, max_age: float = 60.0,
+                 session_gap: float = 4 * 3600):
+        self.window = window
+        self.max_bars = max_bars
+        self.max_age = max_age
+        self.session_gap = session_gap
+        self._lock = threading.Lock()
+        self._bars = {}  # ticker -> (timestamps, opens, closes)
+        self._refreshed = {}  # ticker -> time.time() of the last download that included it
+
+    def touch(self, tickers: list):
+        """
+        Marks tickers as just downloaded, including ones yfinance had no bars for,
+        so an unknown symbol isn't requested again on every call.
+        """
+        now = time.time()
+        with self._lock:
+            self._refreshed.update(dict.fromkeys(tickers, now))
+
+    def extend(self, ticker: str, timestamps, opens, closes):
+        with self._lock:
+            held = self._bars.get(ticker)
+            if held is not None:
+                newer = timestamps > held[0][-1]
+                timestamps, opens, closes = (
+                    np.concatenate((old, new[newer])) for old, new in zip(held, (timestamps, opens, closes))
+                )
+            keep = timestamps >= timestamps[-1] - self.window
+            keep[:-self.max_bars] = False
+            self._bars[ticker] = (timestamps[keep], opens[keep], closes[keep])
+
+    def stale(self, tickers: list) -> list:
+        """
+        The tickers that weren't downloaded within the last max_age seconds. Only the
+        refresh time counts: a ticker yfinance had no bars for stays fresh until
+        then too (see touch()), and frame() reports it as NaN.
+        """
+        now = time.time()
+        with self._lock:
+            return [t for t in tickers if now - self._refreshed.get(t, 0.0) >= self.max_age]
+
+    def frame(self, tickers: list) -> "pd.DataFrame":
+        """
+        One row per ticker with QUOTE_COLUMNS as floats (NaN where there is no data).
+        """
+        import pandas as pd
+
+        last, base, as_of = (np.full(len(tickers), np.nan) for _ in range(3))
+        with self._lock:
+            for row, ticker in enumerate(tickers):
+                held = self._bars.get(ticker)
+                if held is not None:
+                    timestamps, opens, closes = held
+                    breaks = np.flatnonzero(np.diff(timestamps) > self.session_gap)
+                    session_open = opens[breaks[-1] + 1] if len(breaks) else opens[0]
+                    last[row], base[row], as_of[row] = closes[-1], session_open, timestamps[-1]
+        change = last - base
+        with np.errstate(divide="ignore", invalid="ignore"):
+            change_percent = np.where(base != 0, change / base * 100, np.nan)
+        return pd.DataFrame(
+            {"current_price": last, "price_change_24h": change, "change_percent_24h": change_percent, "as_of": as_of},
+            index=pd.Index(tickers, name="ticker"),
+            columns=QUOTE_COLUMNS,
+        )
+
+
+def quote_record(frame: "pd.DataFrame", ticker: str):
+    """
+    A quote frame row as the market_data dict used in data contracts, or None.
+    """
+    if ticker not in frame.index or np.isnan(frame.at[ticker, "current_price"]):
+        return None
+    row = frame.loc[ticker]
+    return {column: _rounded(row[column]) for column in ("current_price", "price_change_24h", "change_percent_24h")}
+
+
+def _rounded(value):
+    # NaN and inf (e.g. the percent change from a zero open) aren't valid JSON
+    value = float(value)
+    return round(value, 2) if np.isfinite(value) else None
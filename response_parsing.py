@@ -0,0 +1,254 @@
+# response_parsing.py
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+import metrics
+
+try:
+    from google.api_core.exceptions import InvalidArgument
+except ImportError:  # google-api-core ships with google-generativeai
+    InvalidArgument = ValueError
+
+# Raised by models/SDK versions that don't accept response_mime_type. The same
+# types cover unrelated failures too, so is_json_mode_rejection() also checks the message.
+JSON_MODE_ERRORS = (TypeError, ValueError, InvalidArgument)
+
+
+def is_json_mode_rejection(error: Exception) -> bool:
+    """
+    True if `error` is the SDK or API refusing response_mime_type, as opposed to
+    e.g. a blocked or empty answer.
+    """
+    return isinstance(error, JSON_MODE_ERRORS) and "mime" in str(error).lower()
+
+
+# --- Schemas for the model responses ---
+class Relationship(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    source_entity: Optional[str] = None
+    target_entity: Optional[str] = None
+    relationship_type: Optional[str] = None
+
+
+class AnalysisBody(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    company_name: Optional[str] = None
+    ticker: Optional[str] = None
+    summary: str
+    news_sentiment: Optional[dict] = None
+    market_data_summary: Optional[str] = None
+
+
+class AnalysisResponse(BaseModel):
+    """
+    What AnalystAgent asks Gemini for: analysis, key figures, relationships and score.
+    """
+    model_config = ConfigDict(extra="allow")
+    analysis: AnalysisBody
+    key_figures_mentioned: Optional[dict] = None
+    relationships: List[Relationship] = []
+    market_impact_score: Optional[float] = Field(default=None, ge=0, le=10)
+
+
+class BatchAnalysisEnvelope(BaseModel):
+    # Items are validated one by one so a single bad entry doesn't sink the batch
+    analyses: List[Any]
+
+
+class CompanyCondition(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    overall_condition: Union[str, dict]
+    impact_analysis: Union[str, dict, list]
+    recommendations: Union[str, dict, list]
+
+
+class ScenarioSimulation(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    predicted_risk_score: float = Field(ge=1, le=10)
+    potential_impact: Union[str, dict, list]
+    suggested_actions: Union[str, dict, list]
+
+
+class StructuredOutputError(Exception):
+    """
+    The model never produced JSON that matched the schema. `raw_text` holds its last answer.
+    """
+    def __init__(self, message: str, raw_text: str = ""):
+        super().__init__(message)
+        self.raw_text = raw_text
+
+
+def _response_text(response) -> str:
+    # The SDK raises ValueError when a candidate was blocked (safety, recitation...)
+    # or came back empty; asking again wouldn't change that, so it isn't retried
+    try:
+        return response.text
+    except ValueError as e:
+        raise StructuredOutputError(f"Model returned no text: {e}") from e
+
+
+# --- Parsing ---
+class IncrementalJSONParser:
+    """
+    Finds the first complete top-level JSON object in a stream of text chunks.
+
+    Each character is scanned once across all feed() calls (tracking string and
+    escape state), and json.loads runs once on the finished object, so callers
+    can stop reading the stream as soon as the object closes.
+    """
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.result = None
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Adds a chunk; returns True once a full object has been parsed into `result`.
+        """
+        if self.result is not None:
+            return True
+        self._text += chunk
+        text = self._text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._start == -1:
+                if char == "{":
+                    self._start = i
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._pos = i + 1
+                    self.result = json.loads(text[self._start:i + 1])
+                    return True
+        self._pos = len(text)
+        return False
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+
+def extract_json(text: str):
+    """
+    Parses a model response into a JSON object. Tries the whole text first (the
+    normal case in JSON mode), then the first balanced {...} block, which skips
+    markdown fences and chatter around the object. Raises ValueError if neither works.
+    """
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        pass
+    parser = IncrementalJSONParser()
+    if not parser.feed(text or ""):
+        raise ValueError("No complete JSON object in model response.")
+    return parser.result
+
+
+JSON_RESPONSE_CONFIG = {"response_mime_type": "application/json"}
+
+
+def _record_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    for kind, field in (("prompt", "prompt_token_count"), ("response", "candidates_token_count")):
+        count = getattr(usage, field, None) if usage is not None else None
+        if isinstance(count, int):
+            metrics.LLM_TOKENS.inc(kind, amount=count)
+
+
+def _generate_json(model, prompt: str) -> str:
+    metrics.UPSTREAM_BYTES.observe(len(prompt.encode("utf-8")), "gemini", "request")
+    with metrics.timed("gemini", "generate_content"):
+        response = model.generate_content(prompt, generation_config=JSON_RESPONSE_CONFIG)
+    text = _response_text(response)
+    metrics.UPSTREAM_BYTES.observe(len(text.encode("utf-8")), "gemini", "response")
+    _record_usage(response)
+    return text
+
+
+def _stream_json(model, prompt: str):
+    # Reads the streamed response only until the first JSON object is complete
+    metrics.UPSTREAM_BYTES.observe(len(prompt.encode("utf-8")), "gemini", "request")
+    parser = IncrementalJSONParser()
+    with metrics.timed("gemini", "stream"):
+        for chunk in model.generate_content(prompt, stream=True):
+            if parser.feed(_response_text(chunk)):
+                break
+    metrics.UPSTREAM_BYTES.observe(len(parser.text.encode("utf-8")), "gemini", "response")
+    if parser.result is None:
+        raise ValueError("No complete JSON object in model response.")
+    return parser.result, parser.text
+
+
+@contextmanager
+def _timed_parse(schema):
+    started = time.perf_counter()
+    try:
+        yield
+    except (ValueError, ValidationError):
+        metrics.PARSE_ERRORS.inc(schema.__name__)
+        raise
+    finally:
+        metrics.PARSE_SECONDS.observe(time.perf_counter() - started, schema.__name__)
+
+
+def generate_structured(model, prompt: str, schema, retries: int = 1, json_mode: bool = True, before_call=None):
+    """
+    Asks a Gemini model for JSON and validates it against a pydantic `schema`.
+
+    Uses the model's JSON response mode; if the model or SDK rejects that, falls
+    back to streaming and parses the object as soon as it is complete. Only a
+    response that fails to parse or validate is retried (with the errors appended
+    to the prompt); API errors propagate to the caller. Returns the validated
+    schema instance, or raises StructuredOutputError once the retries are used up,
+    or straight away if the model returned no text (e.g. a blocked answer).
+    `before_call()`, if given, runs before every model request (e.g. a rate limiter).
+    """
+    attempt_prompt = prompt
+    raw_text = ""
+    error = None
+    for attempt in range(retries + 1):
+        try:
+            if before_call is not None:
+                before_call()
+            if json_mode:
+                try:
+                    raw_text = _generate_json(model, attempt_prompt)
+                except JSON_MODE_ERRORS as e:
+                    if not is_json_mode_rejection(e):
+                        raise
+                    json_mode = False
+            if json_mode:
+                with _timed_parse(schema):
+                    return schema.model_validate(extract_json(raw_text))
+            data, raw_text = _stream_json(model, attempt_prompt)
+            with _timed_parse(schema):
+                return schema.model_validate(data)
+        except (ValueError, ValidationError) as e:
+            # JSONDecodeError is a ValueError too
+            error = e
+        attempt_prompt = (
+            f"{prompt}\n\nYour previous response was rejected: {error}\n"
+            "Return only a JSON object that matches the schema exactly."
+        )
+    raise StructuredOutputError(f"Model response failed validation after {retries + 1} attempts: {error}", raw_text)
@@ -0,0 +1,129 @@
+# riskengine.py
+import re
+
+import numpy as np
+
+# Headline keywords and the risk score a match gives
+HIGH_RISK_KEYWORDS = ("crash", "downfall", "lawsuit", "scandal", "loss")
+MEDIUM_RISK_KEYWORDS = ("drop", "decline", "warning")
+HIGH_RISK_SCORE = 8
+MEDIUM_RISK_SCORE = 5
+LOW_RISK_SCORE = 2
+
+# (24h change below this percent, risk score, summary suffix), most severe first
+MARKET_RULES = (
+    (-5.0, 9, " Market shows significant downward movement."),
+    (-2.0, 6, " Market shows moderate decline."),
+)
+
+_HIGH, _MEDIUM = 2, 1
+
+
+def parse_change_percent(value) -> float:
+    """
+    change_percent_24h as a float; accepts numbers and strings like "-3.2%". NaN if missing.
+    """
+    if value is None:
+        return np.nan
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class RiskEngine:
+    """
+    Rule-based risk scoring for many companies at once.
+
+    All headlines of all companies are scanned in one pass of a single compiled
+    regex (keywords match as substrings, so "losses" and "dropped" count),
+    and the market-move thresholds are applied to a NumPy array of 24h changes.
+    A company's news score is that of its most severe headline, not just the first.
+    """
+    def __init__(self, high_keywords=HIGH_RISK_KEYWORDS, medium_keywords=MEDIUM_RISK_KEYWORDS):
+        self._tiers = {word: _MEDIUM for word in medium_keywords}
+        self._tiers.update({word: _HIGH for word in high_keywords})
+        # A bare alternation of literals (no groups, no \b) lets the regex engine skip
+        # ahead to candidate characters, which is what makes one pass over all
+        # headlines cheaper than scanning them one by one
+        alternatives = sorted(self._tiers, key=len, reverse=True)
+        self._pattern = re.compile("|".join(re.escape(word) for word in alternatives))
+
+    def _headline_tiers(self, headlines: list) -> np.ndarray:
+        # One regex pass over every headline joined together; match offsets are
+        # mapped back to the headline they fall in
+        tiers = np.zeros(len(headlines), dtype=np.int8)
+        if not headlines:
+            return tiers
+        lengths = np.fromiter(map(len, headlines), dtype=np.int64, count=len(headlines)) + 1
+        starts = np.cumsum(lengths) - lengths
+        hits = [(match.start(), self._tiers[match.group()]) for match in self._pattern.finditer("\n".join(headlines))]
+        if hits:
+            positions, values = zip(*hits)
+            owners = np.searchsorted(starts, positions, side="right") - 1
+            np.maximum.at(tiers, owners, np.asarray(values, dtype=np.int8))
+        return tiers
+
+    def score_many(self, companies: list) -> list:
+        """
+        Scores a list of company_data dicts (as built by ScoutAgent.run) and returns
+        one {"company", "risk_score", "summary"} dict per company, in the same order.
+        """
+        count = len(companies)
+        headlines, owners = [], []
+        for index, company_data in enumerate(companies):
+            for article in company_data.get("news_articles") or []:
+                headlines.append(str(article.get("title") or "").lower())
+                owners.append(index)
+        owners = np.asarray(owners, dtype=np.int64)
+
+        tiers = self._headline_tiers(headlines)
+        headline_scores = np.select(
+            [tiers == _HIGH, tiers == _MEDIUM], [HIGH_RISK_SCORE, MEDIUM_RISK_SCORE], LOW_RISK_SCORE
+        )
+        news_scores = np.zeros(count, dtype=np.int64)
+        driver = np.full(count, -1, dtype=np.int64)
+        if len(headlines):
+            np.maximum.at(news_scores, owners, headline_scores)
+            # Per company, the first of its highest-scoring headlines explains the score
+            order = np.lexsort((np.arange(len(headlines)), -headline_scores, owners))
+            first_owners, first_index = np.unique(owners[order], return_index=True)
+            driver[first_owners] = order[first_index]
+
+        changes = np.fromiter(
+            (parse_change_percent((c.get("market_data") or {}).get("change_percent_24h")) for c in companies),
+            dtype=np.float64, count=count,
+        )
+        with np.errstate(invalid="ignore"):
+            conditions = [changes < threshold for threshold, _, _ in MARKET_RULES]
+        market_rule = np.select(conditions, np.arange(len(MARKET_RULES)), -1)
+        market_scores = np.select(conditions, [score for _, score, _ in MARKET_RULES], 0)
+        risk_scores = np.maximum(news_scores, market_scores)
+
+        # Plain lists: indexing NumPy scalars one by one is slower than the scoring itself
+        news_scores, driver = news_scores.tolist(), driver.tolist()
+        market_rule, risk_scores = market_rule.tolist(), risk_scores.tolist()
+        reports = []
+        for index, company_data in enumerate(companies):
+            summary = "No significant risk detected."
+            if driver[index] >= 0:
+                headline = headlines[driver[index]]
+                if news_scores[index] == HIGH_RISK_SCORE:
+                    summary = f"High risk detected due to headline: {headline}"
+                elif news_scores[index] == MEDIUM_RISK_SCORE:
+                    summary = f"Medium risk detected due to headline: {headline}"
+                else:
+                    summary = f"Low risk. Latest news headline: {headline}"
+            if market_rule[index] >= 0:
+                summary += MARKET_RULES[market_rule[index]][2]
+            reports.append({
+                "company": company_data.get("company_name", "N/A"),
+                "risk_score": risk_scores[index],
+                "summary": summary,
+            })
+        return reports
+
+    def score(self, company_data: dict) -> dict:
+        return self.score_many([company_data])[0]
@@ -1,23 +1,77 @@
 # In your rohan.py file
 
-import os
 import json
-import google.generativeai as genai
-from dotenv import load_dotenv
+import logging
+from pydantic import ValidationError
+
+from config import generative_model
+from response_parsing import AnalysisResponse, BatchAnalysisEnvelope, StructuredOutputError, generate_structured
+
+logger = logging.getLogger(__name__)
+
+
+def analysis_schema(company_name="The company_name from the data contract",
+                    ticker="The ticker from the data contract",
+                    market_data="The market_data object from the data contract, copied as-is") -> str:
+    """
+    The JSON schema both analysis prompts send. The single-company prompt fills in
+    the company's own name, ticker and market data; the batched one keeps the
+    descriptions, since the model fills those in from each data contract.
+    """
+    return json.dumps({
+        "analysis": {
+            "company_name": company_name,
+            "ticker": ticker,
+            "summary": "A concise one to two-sentence summary of the most critical news.",
+            "news_sentiment": {
+                "direct_impact_on_jpm": "Analyze the direct impact of the news on the company.",
+                "indirect_impact_on_jpm": "Analyze any indirect or broader market impacts.",
+            },
+            "market_data_summary": "A brief summary of the provided market data.",
+        },
+        "key_figures_mentioned": {
+            "jpm_market_data": market_data,
+            "other_company_targets_by_jpm": [],
+        },
+        "relationships": [
+            {
+                "source_entity": "The company initiating an action",
+                "target_entity": "The company being acted upon",
+                "relationship_type": "The type of relationship (e.g., acquired, invested in)",
+            }
+        ],
+        "market_impact_score": "A numerical score from 1 (low impact) to 10 (high impact) based on the news.",
+    }, indent=4)
 
-load_dotenv()
-API_KEY = os.getenv('GEMINI_API_KEY')
-if not API_KEY:
-    raise ValueError("GEMINI_API_KEY not found in .env file.")
-genai.configure(api_key=API_KEY)
 
 class AnalystAgent:
-    def __init__(self):
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+    def __init__(self, rate_limiter=None, model_name: str = None):
+        self.model_name = model_name
+        self._model = None
+        # Optional shared limiter (see scheduler.RateLimiter), acquired before every Gemini call
+        self.rate_limiter = rate_limiter
 
-    def analyze_data_contract(self, data_contract: dict) -> str:
-        print("Analyst Agent: Analyzing data contract with master prompt...")
+    @property
+    def model(self):
+        # Built on first use so importing or constructing the agent needs no API key
+        if self._model is None:
+            self._model = generative_model(self.model_name)
+        return self._model
+
+    def _before_call(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def analyze_data_contract(self, data_contract: dict):
+        """
+        Returns the validated analysis as a dict, or None if Gemini failed or never
+        produced JSON matching AnalysisResponse.
+        """
+        logger.debug("Analyzing data contract for %s", data_contract.get("company_name"))
         
+        schema = analysis_schema(
+            data_contract.get('company_name', 'N/A'), data_contract.get('ticker', 'N/A'), data_contract.get('market_data')
+        )
         # This master prompt forces the AI to be much more reliable.
         prompt = f"""
         You are a financial analysis AI. Your sole job is to return a single, clean JSON object with no extra text, explanations, or markdown.
@@ -26,30 +80,7 @@ class AnalystAgent:
         The "relationships" list should contain any financial connections found in the news. If none are found, return an empty list [].
 
         JSON SCHEMA:
-        {{
-            "analysis": {{
-                "company_name": "{data_contract.get('company_name', 'N/A')}",
-                "ticker": "{data_contract.get('ticker', 'N/A')}",
-                "summary": "A concise one to two-sentence summary of the most critical news.",
-                "news_sentiment": {{
-                    "direct_impact_on_jpm": "Analyze the direct impact of the news on the company.",
-                    "indirect_impact_on_jpm": "Analyze any indirect or broader market impacts."
-                }},
-                "market_data_summary": "A brief summary of the provided market data."
-            }},
-            "key_figures_mentioned": {{
-                "jpm_market_data": {json.dumps(data_contract.get('market_data'))},
-                "other_company_targets_by_jpm": []
-            }},
-            "relationships": [
-                {{
-                    "source_entity": "The company initiating an action",
-                    "target_entity": "The company being acted upon",
-                    "relationship_type": "The type of relationship (e.g., acquired, invested in)"
-                }}
-            ],
-            "market_impact_score": "A numerical score from 1 (low impact) to 10 (high impact) based on the news."
-        }}
+        {schema}
 
         ---
         DATA CONTRACT TO ANALYZE:
@@ -57,8 +88,67 @@ class AnalystAgent:
         ---
         """
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return generate_structured(self.model, prompt, AnalysisResponse, before_call=self._before_call).model_dump()
+        except StructuredOutputError as e:
+            logger.warning("Gemini did not return a valid analysis: %s", e)
+            return None
+        except Exception as e:
+            logger.error("An error occurred during Gemini API call: %s", e)
+            return None
+
+    def analyze_data_contracts(self, data_contracts: list) -> list:
+        """
+        Analyzes several companies with a single Gemini request.
+
+        The JSON schema is sent once and the model returns one analysis per company,
+        keyed by ticker. Returns the analysis dicts (or None on failure) in the same
+        order as `data_contracts`. Companies the model dropped or answered with
+        entries that fail validation are re-run individually with analyze_data_contract.
+        """
+        if len(data_contracts) <= 1:
+            return [self.analyze_data_contract(data_contract) for data_contract in data_contracts]
+
+        tickers = [data_contract.get("ticker") for data_contract in data_contracts]
+        logger.debug("Analyzing %d data contracts in one batched prompt", len(data_contracts))
+        prompt = f"""
+        You are a financial analysis AI. Your sole job is to return a single, clean JSON object with no extra text, explanations, or markdown.
+
+        You are given {len(data_contracts)} data contracts, one per company. Analyze each one independently and return:
+        {{"analyses": [ ...one object per company... ]}}
+
+        Every object in "analyses" must follow this JSON schema, with "analysis.ticker" set to that company's ticker.
+        The "relationships" list should contain any financial connections found in that company's news. If none are found, return an empty list [].
+
+        JSON SCHEMA:
+        {analysis_schema()}
+
+        ---
+        DATA CONTRACTS TO ANALYZE:
+        {json.dumps(data_contracts, indent=2)}
+        ---
+        """
+        by_ticker = {}
+        try:
+            batch = generate_structured(self.model, prompt, BatchAnalysisEnvelope, before_call=self._before_call)
+            for entry in batch.analyses:
+                try:
+                    analysis_data = AnalysisResponse.model_validate(entry).model_dump()
+                except ValidationError:
+                    continue
+                ticker = analysis_data["analysis"].get("ticker")
+                if ticker in tickers and ticker not in by_ticker:
+                    by_ticker[ticker] = analysis_data
         except Exception as e:
-            print(f"Analyst Agent: An error occurred during Gemini API call: {e}")
-            return "{{}}"
\ No newline at end of file
+            logger.error("An error occurred during batched Gemini API call: %s", e)
+
+        # Duplicate tickers can't be told apart in the response, so those go solo too
+        duplicates = {ticker for ticker in tickers if tickers.count(ticker) > 1}
+        results = []
+        for data_contract, ticker in zip(data_contracts, tickers):
+            analysis_data = by_ticker.get(ticker) if ticker not in duplicates else None
+            if analysis_data is None:
+                logger.info("No usable batched analysis for %s, falling back to a single call", ticker)
+                results.append(self.analyze_data_contract(data_contract))
+            else:
+                results.append(analysis_data)
+        return results
@@ -0,0 +1,207 @@
+# scheduler.py
+import heapq
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket shared by every worker, e.g. one for NewsAPI and one
+    for Gemini. acquire() blocks until a token is free.
+    """
+    def __init__(self, per_minute: float, burst: int = None):
+        # Zero or negative limits (e.g. from the watchlist config) would stall acquire() forever
+        if not per_minute > 0:
+            raise ValueError(f"Rate limit must be a positive number of calls per minute, got {per_minute!r}.")
+        if burst is not None and burst < 1:
+            raise ValueError(f"Rate limit burst must be at least 1, got {burst!r}.")
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1, int(per_minute // 6))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class WatchItem:
+    """
+    One company on the watchlist and its scheduling state.
+    """
+    def __init__(self, company_name: str, ticker: str, interval: float):
+        self.company_name = company_name
+        self.ticker = ticker
+        self.interval = interval
+        self.next_due = 0.0
+        self.last_impact_score = None
+        # Set while the item is somewhere in a processing pipeline
+        self.in_flight = False
+        self.runs = 0
+        self.failures = 0
+
+    @property
+    def priority(self) -> float:
+        # Companies whose last analysis had a high market impact go first
+        return self.last_impact_score or 0.0
+
+
+def parse_impact_score(value):
+    """
+    market_impact_score comes back from the LLM as a number or a numeric string.
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load_watchlist_config(path: str) -> dict:
+    """
+    Reads a watchlist config file (JSON, or YAML if the name ends in .yaml/.yml).
+    See watchlist.example.json for the format.
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class MonitorScheduler:
+    """
+    Monitors a watchlist of companies on a worker pool.
+
+    Each company has its own polling interval with random jitter so that hundreds
+    of companies don't all fire on the same tick. When more companies are due than
+    there are free workers, the ones with the highest recent market_impact_score go
+    first, and companies above `high_impact_score` are polled `high_impact_factor`
+    times as often until their score drops.
+
+    `process(item)` does one scout -> analyst -> store pass and returns the
+    market_impact_score (or None).
+    """
+    def __init__(self, items, process, workers: int = 8, jitter: float = 0.1,
+                 high_impact_score: float = 7.0, high_impact_factor: float = 0.25):
+        self.items = list(items)
+        self.process = process
+        self.workers = workers
+        self.jitter = jitter
+        self.high_impact_score = high_impact_score
+        self.high_impact_factor = high_impact_factor
+        self._pending = []  # (next_due, seq, item)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._free_workers = workers
+        self._stop = threading.Event()
+
+        # Spread the first round over one jitter window instead of a thundering herd
+        now = time.monotonic()
+        for item in self.items:
+            item.next_due = now + random.uniform(0, self.jitter * item.interval)
+            self._push(item)
+
+    @classmethod
+    def from_config(cls, config: dict, process):
+        default_interval = config.get("default_interval", 300)
+        items = [
+            WatchItem(entry["name"], entry.get("ticker", entry["name"]), entry.get("interval", default_interval))
+            for entry in config.get("companies", [])
+        ]
+        priority = config.get("priority", {})
+        return cls(
+            items,
+            process,
+            workers=config.get("workers", 8),
+            jitter=config.get("jitter", 0.1),
+            high_impact_score=priority.get("high_impact_score", 7.0),
+            high_impact_factor=priority.get("interval_factor", 0.25),
+        )
+
+    def _push(self, item):
+        # Caller holds the lock (or is still in __init__)
+        self._seq += 1
+        heapq.heappush(self._pending, (item.next_due, self._seq, item))
+
+    def _next_interval(self, item) -> float:
+        interval = item.interval
+        if item.last_impact_score is not None and item.last_impact_score >= self.high_impact_score:
+            interval *= self.high_impact_factor
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _take_due(self):
+        # Caller holds the lock. Returns the highest-priority due item, or None.
+        now = time.monotonic()
+        due = []
+        while self._pending and self._pending[0][0] <= now:
+            due.append(heapq.heappop(self._pending))
+        if not due:
+            return None
+        due.sort(key=lambda entry: (-entry[2].priority, entry[0]))
+        for entry in due[1:]:
+            heapq.heappush(self._pending, entry)
+        return due[0][2]
+
+    def _run_item(self, item):
+        try:
+            score = parse_impact_score(self.process(item))
+            if score is not None:
+                item.last_impact_score = score
+        except Exception as e:
+            item.failures += 1
+            logger.error("Cycle for %s failed: %s", item.company_name, e)
+        finally:
+            item.runs += 1
+            with self._lock:
+                item.next_due = time.monotonic() + self._next_interval(item)
+                self._push(item)
+                self._free_workers += 1
+                self._wakeup.notify()
+
+    def run_forever(self):
+        """
+        Dispatches due companies to the worker pool until stop() is called.
+        """
+        logger.info("Monitoring %d companies with %d workers.", len(self.items), self.workers)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="monitor") as pool:
+            while not self._stop.is_set():
+                with self._lock:
+                    item = self._take_due() if self._free_workers else None
+                    if item is None:
+                        timeout = 1.0
+                        if self._free_workers and self._pending:
+                            timeout = min(timeout, max(0.0, self._pending[0][0] - time.monotonic()))
+                        self._wakeup.wait(timeout)
+                        continue
+                    self._free_workers -= 1
+                pool.submit(self._run_item, item)
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._wakeup.notify_all()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "companies": len(self.items),
+                "busy_workers": self.workers - self._free_workers,
+                "runs": sum(item.runs for item in self.items),
+                "failures": sum(item.failures for item in self.items),
+            }
@@ -0,0 +1,403 @@
+# timeseries.py
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Numeric columns kept per sample; a value that wasn't part of a sample is NaN
+COLUMNS = ("current_price", "price_change_24h", "change_percent_24h", "risk_score", "market_impact_score")
+
+SECONDS_PER_DAY = 86400
+
+ROWS_WRITTEN = REGISTRY.counter("timeseries_rows_written_total", "Samples written to the time-series store.")
+CHUNKS_WRITTEN = REGISTRY.counter(
+    "timeseries_chunks_written_total", "Chunk files written to the time-series store.", ("kind",)
+)
+
+
+def as_number(value) -> float:
+    """
+    A sample value as a float: numbers, numeric strings (a trailing % is
+    ignored, as in "-1.5%") and None, which becomes NaN.
+    """
+    if value is None:
+        return float("nan")
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def snapshot_row(ticker: str, market_data: dict = None, risk_score=None, market_impact_score=None,
+                 ts: float = None) -> dict:
+    """
+    One sample for TimeSeriesStore.append(): a market_data dict as returned by
+    ScoutAgent.fetch_market_data plus whichever scores were computed with it.
+    """
+    market_data = market_data or {}
+    row = {column: as_number(market_data.get(column)) for column in COLUMNS[:3]}
+    row.update(
+        ticker=ticker,
+        ts=time.time() if ts is None else ts,
+        risk_score=as_number(risk_score),
+        market_impact_score=as_number(market_impact_score),
+    )
+    return row
+
+
+def _day_name(day: int) -> str:
+    return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day))).isoformat()
+
+
+def _day_number(name: str) -> int:
+    return (datetime.date.fromisoformat(name) - datetime.date(1970, 1, 1)).days
+
+
+def _ticker_dir(ticker: str) -> str:
+    # Tickers can be company names ("JP Morgan") or contain "/" and "^"
+    name = quote(ticker, safe="")
+    return "%2E" + name[1:] if name.startswith(".") else name
+
+
+@contextmanager
+def _file_lock(path: str):
+    """
+    Holds an exclusive lock on `path` (created if missing) across processes.
+    """
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _concat(parts: list, columns) -> dict:
+    if not parts:
+        return {"ts": np.empty(0, dtype=np.int64), **{c: np.empty(0) for c in columns}}
+    return {key: np.concatenate([part[key] for part in parts]) for key in ("ts", *columns)}
+
+
+def _sorted(arrays: dict) -> dict:
+    order = np.argsort(arrays["ts"], kind="stable")
+    if np.all(order[:-1] < order[1:]):
+        return arrays
+    return {key: values[order] for key, values in arrays.items()}
+
+
+class TimeSeriesStore:
+    """
+    Append-only history of market snapshots and risk scores, so trends can be read
+    back without asking the upstreams again.
+
+    Samples are buffered in memory and written in batches as compressed NumPy
+    chunks, one set of columns per file, under <root>/<ticker>/<YYYY-MM-DD>/ (UTC
+    days). A flush writes one new chunk per ticker and day it touched; once a day
+    has more than `max_chunks` files they are merged into one. Range scans only open
+    the days they cover, and decoded days are kept in an LRU holding up to
+    `max_cached_rows` samples, revalidated against the directory listing, so
+    repeated trend queries over months of history don't touch the disk again.
+
+    append() flushes on its own once `batch_size` samples are pending or the oldest
+    is `flush_interval` seconds old (pass None for either to turn that off and call
+    flush() yourself). Nothing is created on disk until the first flush. Several processes can share a root: chunk names are unique
+    per process, a day is only compacted under an exclusive lock on its
+    compact.lock file, and a merged chunk records which files it replaced so
+    readers never count a sample twice.
+    """
+    def __init__(self, root: str = ".cache/timeseries", batch_size: int = 500, flush_interval: float = 5.0,
+                 max_chunks: int = 16, max_cached_rows: int = 1_000_000):
+        self.root = root
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_chunks = max_chunks
+        self.max_cached_rows = max_cached_rows
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = []  # rows waiting for the next flush
+        self._oldest_pending = None
+        self._sequence = 0
+        self._cache_lock = threading.Lock()
+        self._partitions = OrderedDict()  # (ticker, day) -> (chunk names, arrays)
+        self._cached_rows = 0
+        self.rows_written = 0
+        self.chunks_written = 0
+        self.hits = 0
+        self.misses = 0
+
+    # --- Writing ---
+    def append(self, rows: list):
+        """
+        Buffers samples (dicts with "ticker", optional "ts" in epoch seconds and any
+        of COLUMNS; see snapshot_row) and flushes if a batch is due.
+        """
+        rows = [row for row in rows if row.get("ticker")]
+        if not rows:
+            return
+        now = time.time()
+        with self._lock:
+            self._pending.extend(rows)
+            if self._oldest_pending is None:
+                self._oldest_pending = now
+            due = (self.batch_size is not None and len(self._pending) >= self.batch_size) or (
+                self.flush_interval is not None and now - self._oldest_pending >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """
+        Writes every pending sample and returns how many were written.
+        """
+        with self._lock:
+            rows, self._pending, self._oldest_pending = self._pending, [], None
+        if not rows:
+            return 0
+        now = time.time()
+        tickers = np.array([row["ticker"] for row in rows], dtype=object)
+        ts = np.array([row.get("ts", now) for row in rows], dtype=np.float64).astype(np.int64)
+        values = {c: np.array([as_number(row.get(c)) for row in rows], dtype=np.float64) for c in COLUMNS}
+        days = ts // SECONDS_PER_DAY
+        with self._write_lock:
+            for ticker in dict.fromkeys(tickers.tolist()):
+                of_ticker = tickers == ticker
+                for day in np.unique(days[of_ticker]):
+                    mask = of_ticker & (days == day)
+                    partition = os.path.join(self.root, _ticker_dir(ticker), _day_name(day))
+                    self._write_chunk(partition, {"ts": ts[mask], **{c: values[c][mask] for c in COLUMNS}})
+                    if len(self._chunk_names(partition)) > self.max_chunks:
+                        self._compact_partition(partition)
+        self.rows_written += len(rows)
+        ROWS_WRITTEN.inc(amount=len(rows))
+        return len(rows)
+
+    def _write_chunk(self, partition: str, arrays: dict, prefix: str = "", replaces=()) -> str:
+        os.makedirs(partition, exist_ok=True)
+        self._sequence += 1
+        name = f"{prefix}{time.time_ns():020d}-{os.getpid()}-{self._sequence:06d}.npz"
+        temporary = os.path.join(partition, name + ".tmp")
+        with open(temporary, "wb") as f:
+            np.savez_compressed(f, replaces=np.array(sorted(replaces), dtype=str), **arrays)
+        # Readers only list *.npz, so they never see a half-written chunk
+        os.replace(temporary, os.path.join(partition, name))
+        self.chunks_written += 1
+        CHUNKS_WRITTEN.inc("compacted" if replaces else "batch")
+        return name
+
+    def _compact_partition(self, partition: str):
+        # Without the lock two processes could each write a merged chunk of the same files
+        with _file_lock(os.path.join(partition, "compact.lock")):
+            # Listed under the lock, so a merge another process just finished is seen
+            names = self._chunk_names(partition)
+            if len(names) < 2:
+                return
+            arrays, live = self._load_chunks(partition, names)
+            self._write_chunk(partition, _sorted(arrays), prefix="c", replaces=live)
+            for name in live:
+                try:
+                    os.remove(os.path.join(partition, name))
+                except FileNotFoundError:
+                    pass
+
+    def compact(self, ticker: str = None) -> int:
+        """
+        Merges each day's chunks (of one ticker, or all) into a single file.
+        Returns how many days were compacted.
+        """
+        self.flush()
+        tickers = [ticker] if ticker is not None else self.tickers()
+        compacted = 0
+        with self._write_lock:
+            for name in tickers:
+                directory = os.path.join(self.root, _ticker_dir(name))
+                for day in self._day_names(directory):
+                    partition = os.path.join(directory, day)
+                    if len(self._chunk_names(partition)) > 1:
+                        self._compact_partition(partition)
+                        compacted += 1
+        return compacted
+
+    # --- Reading ---
+    @staticmethod
+    def _chunk_names(partition: str) -> tuple:
+        try:
+            return tuple(sorted(name for name in os.listdir(partition) if name.endswith(".npz")))
+        except FileNotFoundError:
+            return ()
+
+    @staticmethod
+    def _day_names(directory: str) -> list:
+        try:
+            return sorted(name for name in os.listdir(directory) if len(name) == 10 and name[4] == "-")
+        except FileNotFoundError:
+            return []
+
+    def _load_chunks(self, partition: str, names: tuple):
+        # Returns the partition's samples sorted by time and the chunk names they came from
+        loaded, replaced = {}, set()
+        for name in names:
+            with np.load(os.path.join(partition, name)) as chunk:
+                loaded[name] = {key: chunk[key] for key in ("ts", *COLUMNS)}
+                replaced.update(chunk["replaces"].tolist())
+        live = [name for name in names if name not in replaced]
+        return _sorted(_concat([loaded[name] for name in live], COLUMNS)), live
+
+    def _partition(self, ticker: str, day: str) -> dict:
+        partition = os.path.join(self.root, _ticker_dir(ticker), day)
+        key = (ticker, day)
+        for attempt in range(3):
+            names = self._chunk_names(partition)
+            with self._cache_lock:
+                cached = self._partitions.get(key)
+                if cached is not None and cached[0] == names:
+                    self._partitions.move_to_end(key)
+                    self.hits += 1
+                    return cached[1]
+            try:
+                arrays, _ = self._load_chunks(partition, names)
+                break
+            except FileNotFoundError:
+                # A chunk was merged away between listing and reading; list again
+                if attempt == 2:
+                    raise
+        with self._cache_lock:
+            self.misses += 1
+            replaced = self._partitions.pop(key, None)
+            if replaced is not None:
+                self._cached_rows -= len(replaced[1]["ts"])
+            self._partitions[key] = (names, arrays)
+            self._cached_rows += len(arrays["ts"])
+            while self._cached_rows > self.max_cached_rows and len(self._partitions) > 1:
+                _, (_, evicted) = self._partitions.popitem(last=False)
+                self._cached_rows -= len(evicted["ts"])
+        return arrays
+
+    def _pending_for(self, ticker: str, columns) -> dict:
+        with self._lock:
+            rows = [row for row in self._pending if row["ticker"] == ticker]
+        now = time.time()
+        return {
+            "ts": np.array([row.get("ts", now) for row in rows], dtype=np.float64).astype(np.int64),
+            **{c: np.array([as_number(row.get(c)) for row in rows], dtype=np.float64) for c in columns},
+        }
+
+    def tickers(self) -> list:
+        """
+        Every ticker with stored (or pending) samples.
+        """
+        with self._lock:
+            pending = {row["ticker"] for row in self._pending}
+        try:
+            stored = {unquote(name) for name in os.listdir(self.root)}
+        except FileNotFoundError:
+            stored = set()
+        return sorted(stored | pending)
+
+    def scan(self, ticker: str, start: float = None, end: float = None, columns=COLUMNS) -> dict:
+        """
+        The ticker's samples with start <= ts < end (epoch seconds, either bound
+        optional) as {"ts": int64 array, column: float64 array}, sorted by time.
+        Pending samples are included.
+        """
+        columns = tuple(columns)
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}")
+        first_day = None if start is None else int(start) // SECONDS_PER_DAY
+        last_day = None if end is None else (int(np.ceil(end)) - 1) // SECONDS_PER_DAY
+        parts = []
+        for day in self._day_names(os.path.join(self.root, _ticker_dir(ticker))):
+            number = _day_number(day)
+            if (first_day is not None and number < first_day) or (last_day is not None and number > last_day):
+                continue
+            parts.append(self._partition(ticker, day))
+        parts.append(self._pending_for(ticker, columns))
+        arrays = _sorted(_concat(parts, columns))
+        ts = arrays["ts"]
+        lo = 0 if start is None else np.searchsorted(ts, start, side="left")
+        hi = len(ts) if end is None else np.searchsorted(ts, end, side="left")
+        return {key: values[lo:hi] for key, values in arrays.items()}
+
+    def downsample(self, ticker: str, bucket: int, start: float = None, end: float = None,
+                   columns=COLUMNS) -> dict:
+        """
+        The scan() range reduced to one row per `bucket` seconds (aligned to the
+        epoch), for trends: {"bucket_start", "count", column: {"min", "max", "mean"}}.
+        NaNs are ignored, so a bucket's statistic is NaN only if it had no values.
+        Buckets without samples are left out.
+        """
+        bucket = int(bucket)
+        if bucket <= 0:
+            raise ValueError("bucket must be a positive number of seconds.")
+        columns = tuple(columns)
+        arrays = self.scan(ticker, start, end, columns)
+        ts = arrays["ts"]
+        if len(ts) == 0:
+            return {"bucket_start": ts, "count": np.empty(0, dtype=np.int64), **{c: {} for c in columns}}
+        ids = ts // bucket
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+        result = {
+            "bucket_start": (ids[starts] * bucket).astype(np.int64),
+            "count": np.diff(np.append(starts, len(ts))),
+        }
+        for column in columns:
+            values = arrays[column]
+            valid = ~np.isnan(values)
+            counts = np.add.reduceat(valid, starts)
+            sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                mean = np.where(counts > 0, sums / counts, np.nan)
+            result[column] = {
+                "min": np.fmin.reduceat(values, starts),
+                "max": np.fmax.reduceat(values, starts),
+                "mean": mean,
+            }
+        return result
+
+    def close(self):
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cache_lock:
+            cached, cached_rows = len(self._partitions), self._cached_rows
+        total = self.hits + self.misses
+        return {
+            "pending": self.pending(),
+            "rows_written": self.rows_written,
+            "chunks_written": self.chunks_written,
+            "cached_partitions": cached,
+            "cached_rows": cached_rows,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
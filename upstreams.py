@@ -0,0 +1,88 @@
+# upstreams.py
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class UpstreamTimeout(Exception):
+    """
+    Raised when an upstream call (including time spent waiting for a slot) takes
+    longer than that upstream's timeout.
+    """
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"{name} did not respond within {timeout}s.")
+        self.name = name
+        self.timeout = timeout
+
+
+class Upstream:
+    """
+    Runs blocking calls for one upstream (Gemini, NewsAPI, yfinance, Neo4j) from
+    async handlers on that upstream's own bounded thread pool.
+
+    Each upstream has its own concurrency limit and timeout, so a burst of slow
+    Gemini calls fills only the Gemini pool and can't starve graph reads. A slot is
+    held until the worker thread really finishes, even if the caller timed out,
+    so a hung upstream can't grow past its limit.
+    """
+    def __init__(self, name: str, max_concurrency: int, timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"upstream-{name}")
+        # Created on first use so it binds to the server's running event loop
+        self._semaphore = None
+        self.calls = 0
+        self.in_flight = 0
+        self.timeouts = 0
+        self.errors = 0
+
+    async def _run(self, call):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, call)
+        except BaseException:
+            self.in_flight -= 1
+            self._semaphore.release()
+            raise
+
+        def _release(_):
+            self.in_flight -= 1
+            self._semaphore.release()
+
+        future.add_done_callback(_release)
+        # Shielded so a caller timeout doesn't mark the future done (and free the
+        # slot) while the worker thread is still busy
+        return await asyncio.shield(future)
+
+    async def call(self, fn, *args, **kwargs):
+        """
+        Runs fn(*args, **kwargs) on this upstream's pool and returns its result.
+        Raises UpstreamTimeout if it takes longer than `timeout` seconds.
+        """
+        self.calls += 1
+        try:
+            return await asyncio.wait_for(self._run(functools.partial(fn, *args, **kwargs)), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise UpstreamTimeout(self.name, self.timeout)
+        except Exception:
+            self.errors += 1
+            raise
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout,
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
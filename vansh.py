@@ -1,10 +1,10 @@
 import time
-import json
-import re
 import sys
 import io
+import argparse
+import logging
+import threading
 from rich.console import Console
-from rich.markdown import Markdown
 from rich.table import Table
 
 # --- Agent and Database Imports ---
@@ -13,60 +13,66 @@ from agents import ScoutAgent
 from rohan import AnalystAgent
 from NetworkAnalystAgent import NetworkAnalystAgent
 from database import DatabaseManager
+from scheduler import MonitorScheduler, RateLimiter, load_watchlist_config, parse_impact_score
+from pipeline import Pipeline, Stage
+from fingerprints import FingerprintStore
+from timeseries import TimeSeriesStore, snapshot_row
+from metrics import configure_logging
+from config import get_settings
 
 # Fix for potential Unicode output errors on Windows
 if sys.stdout.encoding.lower() != 'utf-8':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
 console = Console()
+logger = logging.getLogger(__name__)
 
-def extract_json_from_text(text: str):
+def select_new_data(fingerprint_store: FingerprintStore, data_contract: dict):
     """
-    Finds and extracts the first valid JSON object from a string.
+    Trims the data contract down to articles the analyst hasn't seen yet.
+    Returns None when there are no new articles and the market hasn't moved,
+    so the caller can skip the Gemini call and the graph write.
     """
-    try:
-        start_index = text.find('{')
-        end_index = text.rfind('}')
-        if start_index != -1 and end_index != -1 and end_index > start_index:
-            json_str = text[start_index:end_index+1]
-            json.loads(json_str)
-            return json_str
-    except (json.JSONDecodeError, IndexError):
+    company_name = data_contract["company_name"]
+    new_articles = fingerprint_store.new_articles(company_name, data_contract.get("news_articles") or [])
+    if not new_articles and not fingerprint_store.market_changed(company_name, data_contract.get("market_data")):
         return None
-    return None
+    return {**data_contract, "news_articles": new_articles}
 
 def print_analysis_tables(data):
     """
     The robust version of your display function.
     """
-    analysis = data.get("analysis", {})
+    analysis = data.get("analysis") or {}
     key_figures = data.get("key_figures_mentioned") or {}
-    market_impact_score = data.get("market_impact_score", "N/A")
+    market_impact_score = data.get("market_impact_score")
+    if market_impact_score is None:
+        market_impact_score = "N/A"
 
     # Summary Table
     console.print("[bold underline]Analysis Summary[/bold underline]")
     summary_table = Table(show_header=False, box=None)
-    summary_table.add_row("Company:", analysis.get("company_name", "N/A"))
-    summary_table.add_row("Ticker:", analysis.get("ticker", "N/A"))
-    summary_table.add_row("Summary:", analysis.get("summary", "N/A"))
+    summary_table.add_row("Company:", analysis.get("company_name") or "N/A")
+    summary_table.add_row("Ticker:", analysis.get("ticker") or "N/A")
+    summary_table.add_row("Summary:", analysis.get("summary") or "N/A")
     summary_table.add_row("Market Impact Score:", str(market_impact_score))
     console.print(summary_table)
     console.print()
 
     # News Sentiment Table
     console.print("[bold underline]News Sentiment[/bold underline]")
-    sentiment = analysis.get("news_sentiment", {})
+    sentiment = analysis.get("news_sentiment") or {}
     sentiment_table = Table(show_header=True, header_style="bold magenta")
     sentiment_table.add_column("Aspect", style="dim")
     sentiment_table.add_column("Description")
-    sentiment_table.add_row("Direct Impact", sentiment.get("direct_impact_on_jpm", "N/A"))
-    sentiment_table.add_row("Indirect Impact", sentiment.get("indirect_impact_on_jpm", "N/A"))
+    sentiment_table.add_row("Direct Impact", sentiment.get("direct_impact_on_jpm") or "N/A")
+    sentiment_table.add_row("Indirect Impact", sentiment.get("indirect_impact_on_jpm") or "N/A")
     console.print(sentiment_table)
     console.print()
 
     # Market data summary
     console.print("[bold underline]Market Data Summary[/bold underline]")
-    console.print(analysis.get("market_data_summary", "N/A"))
+    console.print(analysis.get("market_data_summary") or "N/A")
     console.print()
 
     # JPM Market Data Table
@@ -77,7 +83,10 @@ def print_analysis_tables(data):
     jpm_table.add_column("Value")
     jpm_table.add_row("Current Price", f"${jpm_data.get('current_price', 'N/A')}")
     jpm_table.add_row("Price Change (24h)", f"${jpm_data.get('price_change_24h', 'N/A')}")
-    jpm_table.add_row("Change Percent (24h)", jpm_data.get("change_percent_24h", "N/A"))
+    change_percent = jpm_data.get("change_percent_24h", "N/A")
+    if isinstance(change_percent, (int, float)):
+        change_percent = f"{change_percent}%"
+    jpm_table.add_row("Change Percent (24h)", str(change_percent))
     console.print(jpm_table)
     console.print()
 
@@ -101,12 +110,167 @@ def print_analysis_tables(data):
         console.print("No other targets data available in this analysis.")
 
 
+def build_pipeline(pipeline_config: dict, scout_agent, analyst_agent, network_agent, fingerprint_store,
+                   news_limiter, timeseries: TimeSeriesStore = None) -> Pipeline:
+    """
+    Wires the agents into the scout -> analyst -> graph store pipeline used in
+    headless mode. Items submitted to it are scheduler WatchItems. If `timeseries`
+    is given, the store stage also records each batch's market snapshots and
+    market_impact_scores there.
+
+    An item's in_flight flag is cleared once it is stored or dropped at any stage,
+    including when a stage raises.
+    """
+    def releasing(fn, item_of):
+        def run(jobs):
+            try:
+                return fn(jobs)
+            except Exception:
+                for job in jobs:
+                    item_of(job).in_flight = False
+                raise
+        return run
+
+    def scout_stage(items):
+        # Quotes for the whole batch come from one yfinance download; see ScoutAgent.run_many
+        for _ in items:
+            news_limiter.acquire()
+        data_contracts = scout_agent.run_many([(item.company_name, item.ticker) for item in items])
+        results = []
+        for item, data_contract in zip(items, data_contracts):
+            if not data_contract.get("news_articles"):
+                logger.info("No new articles found for %s.", item.company_name)
+                item.in_flight = False
+                continue
+
+            data_contract = select_new_data(fingerprint_store, data_contract)
+            if data_contract is None:
+                logger.info("Nothing new for %s since the last analysis, skipping.", item.company_name)
+                item.in_flight = False
+                continue
+            results.append((item, data_contract))
+        return results
+
+    def analyst_stage(jobs):
+        # Several companies share one Gemini request; see AnalystAgent.analyze_data_contracts
+        analyses = analyst_agent.analyze_data_contracts([data_contract for _, data_contract in jobs])
+        results = []
+        for (item, data_contract), analysis_data in zip(jobs, analyses):
+            if not analysis_data:
+                logger.error("Could not find valid JSON in AI response for %s.", item.company_name)
+                item.in_flight = False
+                continue
+            results.append((item, data_contract, analysis_data))
+        return results
+
+    def store_stage(jobs):
+        network_agent.process_and_store_many([(analysis_data, item.company_name) for item, _, analysis_data in jobs])
+        rows = []
+        for item, data_contract, analysis_data in jobs:
+            fingerprint_store.record(item.company_name, data_contract["news_articles"], data_contract.get("market_data"))
+            score = parse_impact_score(analysis_data.get("market_impact_score"))
+            if score is not None:
+                item.last_impact_score = score
+            rows.append(snapshot_row(item.ticker, data_contract.get("market_data"), market_impact_score=score))
+            item.in_flight = False
+        if timeseries is not None:
+            timeseries.append(rows)
+
+    queue_size = pipeline_config.get("queue_size", 50)
+    return Pipeline([
+        Stage("scout", releasing(scout_stage, lambda item: item), concurrency=pipeline_config.get("scout_workers", 4), queue_size=queue_size,
+              batch_size=pipeline_config.get("scout_batch_size", 10),
+              batch_timeout=pipeline_config.get("scout_batch_timeout", 0.5)),
+        Stage("analyst", releasing(analyst_stage, lambda job: job[0]), concurrency=pipeline_config.get("analyst_workers", 4), queue_size=queue_size,
+              batch_size=pipeline_config.get("analyst_batch_size", 5),
+              batch_timeout=pipeline_config.get("analyst_batch_timeout", 1.0)),
+        Stage("store", releasing(store_stage, lambda job: job[0]), concurrency=1, queue_size=queue_size,
+              batch_size=pipeline_config.get("store_batch_size", 20),
+              batch_timeout=pipeline_config.get("store_batch_timeout", 2.0)),
+    ])
+
+
+def run_watchlist(config_path: str):
+    """
+    Headless mode: monitors every company in the watchlist config.
+
+    The scheduler decides when each company is due and feeds it into a staged
+    pipeline (scout -> analyst -> graph store) with bounded queues between the
+    stages, so slow Gemini calls overlap with fetching and graph writes are
+    batched. NewsAPI and Gemini rate limits are shared across all workers.
+    """
+    config = load_watchlist_config(config_path)
+    rate_limits = config.get("rate_limits", {})
+    news_limiter = RateLimiter(rate_limits.get("newsapi_per_minute", 30))
+    llm_limiter = RateLimiter(rate_limits.get("gemini_per_minute", 15))
+    pipeline_config = config.get("pipeline", {})
+
+    scout_agent = ScoutAgent()
+    analyst_agent = AnalystAgent(rate_limiter=llm_limiter)
+    db_manager = DatabaseManager.from_settings(get_settings())
+    db_manager.ensure_schema()
+    network_agent = NetworkAnalystAgent(db_manager)
+    fingerprint_store = FingerprintStore(config.get("fingerprint_path", ".cache/fingerprints.sqlite3"))
+    timeseries = TimeSeriesStore(config.get("timeseries_path", get_settings().timeseries_path))
+    pipeline = build_pipeline(pipeline_config, scout_agent, analyst_agent, network_agent, fingerprint_store,
+                              news_limiter, timeseries)
+
+    def process(item):
+        # Blocks while the scout queue is full, which holds back the scheduler too.
+        # The store stage updates item.last_impact_score once the analysis lands.
+        if item.in_flight:
+            # Still queued or being analysed from an earlier run; don't pay for it twice
+            logger.info("%s is still being processed, skipping this run.", item.company_name)
+            return None
+        item.in_flight = True
+        pipeline.submit(item)
+        return None
+
+    stop_reporting = threading.Event()
+
+    def report_stats():
+        while not stop_reporting.wait(pipeline_config.get("stats_interval", 60)):
+            for name, stats in pipeline.stats().items():
+                logger.info(
+                    "Pipeline [%s]: depth=%s/%s processed=%s dropped=%s errors=%s throughput=%s/s",
+                    name, stats["queue_depth"], stats["queue_size"], stats["processed"],
+                    stats["dropped"], stats["errors"], stats["throughput_per_sec"],
+                )
+
+    scheduler = MonitorScheduler.from_config(config, process)
+    pipeline.start()
+    threading.Thread(target=report_stats, name="pipeline-stats", daemon=True).start()
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        console.print("\n[bold red]Exiting program...[/bold red]")
+        scheduler.stop()
+    finally:
+        stop_reporting.set()
+        pipeline.stop()
+        scout_agent.close()
+        fingerprint_store.close()
+        timeseries.close()
+        db_manager.close()
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Systemic Risk Sentinel monitoring loop.")
+    parser.add_argument("--config", help="Watchlist config file; runs headless over every company in it.")
+    args = parser.parse_args()
+    configure_logging(get_settings().log_level)
+    if args.config:
+        run_watchlist(args.config)
+        return
+
     # --- Initialize all agents and the database manager ---
     scout_agent = ScoutAgent()
     analyst_agent = AnalystAgent()
-    db_manager = DatabaseManager("bolt://localhost:7687", "neo4j", "password")
+    db_manager = DatabaseManager.from_settings(get_settings())
+    db_manager.ensure_schema()
     network_agent = NetworkAnalystAgent(db_manager)
+    fingerprint_store = FingerprintStore()
+    timeseries = TimeSeriesStore(get_settings().timeseries_path)
 
     # --- Ask the user for input at the start ---
     company_name = input("Enter the full company name to monitor (e.g., Microsoft): ")
@@ -124,38 +288,41 @@ def main():
                 print(f"No new articles found for {company_name}, waiting...")
                 time.sleep(60)
                 continue
-            
-            headline = data_contract["news_articles"][0].get("title", "No headline available")
+
+            # Only articles the analyst hasn't seen yet go to Gemini
+            data_contract = select_new_data(fingerprint_store, data_contract)
+            if data_contract is None:
+                print(f"Nothing new for {company_name} since the last analysis, waiting...")
+                time.sleep(60)
+                continue
+
+            new_articles = data_contract["news_articles"]
+            headline = new_articles[0].get("title", "No headline available") if new_articles else "No new headlines (market moved)"
             console.clear()
             console.print(f"[bold blue]Latest News Headline for {company_name}:[/bold blue] {headline}")
 
-            # Step 2: Analyst processes data with Gemini
-            analysis_text = analyst_agent.analyze_data_contract(data_contract)
-
-            # Step 3: Parse the AI's response and process it
-            analysis_data = None
-            try:
-                analysis_data = json.loads(analysis_text)
-            except json.JSONDecodeError:
-                json_str = extract_json_from_text(analysis_text)
-                if json_str:
-                    try:
-                        analysis_data = json.loads(json_str)
-                    except json.JSONDecodeError:
-                        pass 
+            # Step 2: Analyst processes data with Gemini (returns validated JSON or None)
+            analysis_data = analyst_agent.analyze_data_contract(data_contract)
 
+            # Step 3: Store the analysis
             if analysis_data:
                 print_analysis_tables(analysis_data)
                 network_agent.process_and_store(analysis_data, company_name)
+                fingerprint_store.record(company_name, new_articles, data_contract.get("market_data"))
+                timeseries.append([snapshot_row(
+                    ticker, data_contract.get("market_data"),
+                    market_impact_score=parse_impact_score(analysis_data.get("market_impact_score")),
+                )])
             else:
                 console.print("[bold red]Error: Could not find valid JSON in AI response.[/bold red]")
-                console.print(Markdown(analysis_text))
 
             print("\n" + "="*80 + "\n")
             time.sleep(61)
 
     except KeyboardInterrupt:
         console.print("\n[bold red]Exiting program...[/bold red]")
+        fingerprint_store.close()
+        timeseries.close()
         db_manager.close()
 
 